@@ -1,47 +1,198 @@
 # backend/email_service.py
 import os
+import atexit
+import asyncio
+import functools
+import io
 import smtplib
+import queue
+import secrets
+import threading
+import weakref
+from email.generator import BytesGenerator
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Optional, Tuple, Union
 import ssl
 from dotenv import load_dotenv
 
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
 load_dotenv()
 
+# Shared TLS context; building one loads the CA bundle from disk, so do it once
+_SSL_CTX = ssl.create_default_context()
+_SSL_CTX.minimum_version = ssl.TLSVersion.TLSv1_2
+
+# Socket timeout (seconds) for SMTP connects and commands, so a dead pooled connection can't hang a send
+SMTP_TIMEOUT = 10
+
 class EmailService:
     """Service for sending emails through various providers"""
     
+    # Authenticated SMTP sessions shared across calls, keyed by (server, port, sender).
+    # Each queue holds [server, messages_sent] pairs so connections can be recycled.
+    _pool: Dict[Tuple, queue.Queue] = {}
+    _pool_lock = threading.Lock()
+    max_messages_per_conn = 5000
+    
+    # (server, port) implicit TLS endpoints that failed to connect; later sessions go straight to STARTTLS
+    _implicit_tls_down: set = set()
+    
+    # Built-in providers; the "custom" provider is read from the environment.
+    # Implicit TLS (use_ssl on 465) skips the EHLO/STARTTLS round trips; starttls_port
+    # is the STARTTLS endpoint used when the implicit TLS one can't be reached.
+    _CONFIGS: Dict[str, Dict] = {
+        "gmail": {
+            "smtp_server": "smtp.gmail.com",
+            "smtp_port": 465,
+            "use_ssl": True,
+            "use_tls": True,
+            "starttls_port": 587
+        },
+        "outlook": {
+            "smtp_server": "smtp-mail.outlook.com", 
+            "smtp_port": 587,
+            "use_ssl": False,
+            "use_tls": True
+        },
+        "yahoo": {
+            "smtp_server": "smtp.mail.yahoo.com",
+            "smtp_port": 465,
+            "use_ssl": True,
+            "use_tls": True,
+            "starttls_port": 587
+        }
+    }
+    
     def __init__(self, provider: str = "gmail"):
         self.provider = provider.lower()
-        self.smtp_config = self._get_smtp_config()
+        self.smtp_config = self._get_smtp_config(self.provider)
     
-    def _get_smtp_config(self) -> Dict:
+    @classmethod
+    def _get_smtp_config(cls, provider: str) -> Dict:
         """Get SMTP configuration based on provider"""
-        configs = {
-            "gmail": {
-                "smtp_server": "smtp.gmail.com",
-                "smtp_port": 587,
-                "use_tls": True
-            },
-            "outlook": {
-                "smtp_server": "smtp-mail.outlook.com", 
-                "smtp_port": 587,
-                "use_tls": True
-            },
-            "yahoo": {
-                "smtp_server": "smtp.mail.yahoo.com",
-                "smtp_port": 587,
-                "use_tls": True
-            },
-            "custom": {
-                "smtp_server": os.getenv("CUSTOM_SMTP_SERVER", ""),
-                "smtp_port": int(os.getenv("CUSTOM_SMTP_PORT", "587")),
-                "use_tls": os.getenv("CUSTOM_USE_TLS", "true").lower() == "true"
-            }
+        if provider == "custom":
+            return cls._custom_smtp_config()
+        
+        return cls._CONFIGS.get(provider, cls._CONFIGS["gmail"])
+    
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _custom_smtp_config() -> Dict:
+        """Read the custom provider's SMTP configuration from the environment once"""
+        return {
+            "smtp_server": os.getenv("CUSTOM_SMTP_SERVER", ""),
+            "smtp_port": int(os.getenv("CUSTOM_SMTP_PORT", "587")),
+            "use_ssl": os.getenv("CUSTOM_USE_SSL", "false").lower() == "true",
+            "use_tls": os.getenv("CUSTOM_USE_TLS", "true").lower() == "true",
+            "starttls_port": int(os.getenv("CUSTOM_STARTTLS_PORT", "0")) or None
         }
+    
+    def _pool_key(self, sender_email: str) -> Tuple:
+        """Key identifying a reusable SMTP session"""
+        return (self.smtp_config["smtp_server"], self.smtp_config["smtp_port"], sender_email)
+    
+    def _connect(self, sender_email: str, sender_password: str) -> smtplib.SMTP:
+        """Open a new authenticated SMTP session"""
+        config = self.smtp_config
+        
+        endpoint = (config["smtp_server"], config["smtp_port"])
         
-        return configs.get(self.provider, configs["gmail"])
+        if config.get("use_ssl") and config.get("starttls_port") and endpoint in self._implicit_tls_down:
+            # Don't wait out another connect timeout on an endpoint that already failed
+            server = self._connect_starttls(config["smtp_server"], config["starttls_port"])
+        elif config.get("use_ssl"):
+            try:
+                server = smtplib.SMTP_SSL(config["smtp_server"], config["smtp_port"],
+                                          context=_SSL_CTX, timeout=SMTP_TIMEOUT)
+            except OSError:
+                # Implicit TLS endpoint unreachable; fall back to STARTTLS if the provider has one
+                if not config.get("starttls_port"):
+                    raise
+                self._implicit_tls_down.add(endpoint)
+                server = self._connect_starttls(config["smtp_server"], config["starttls_port"])
+        elif config["use_tls"]:
+            server = self._connect_starttls(config["smtp_server"], config["smtp_port"])
+        else:
+            server = smtplib.SMTP(config["smtp_server"], config["smtp_port"], timeout=SMTP_TIMEOUT)
+        
+        try:
+            server.login(sender_email, sender_password)
+        except Exception:
+            self._discard(server)
+            raise
+        return server
+    
+    def _connect_starttls(self, smtp_server: str, smtp_port: int) -> smtplib.SMTP:
+        """Open a plain SMTP connection and upgrade it with STARTTLS"""
+        server = smtplib.SMTP(smtp_server, smtp_port, timeout=SMTP_TIMEOUT)
+        try:
+            server.starttls(context=_SSL_CTX)
+        except Exception:
+            self._discard(server)
+            raise
+        return server
+    
+    @staticmethod
+    def _discard(server: smtplib.SMTP) -> None:
+        """Close a session, ignoring errors from an already dead connection"""
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    
+    def _acquire(self, sender_email: str, sender_password: str) -> list:
+        """Get a live pooled session or open a new one"""
+        key = self._pool_key(sender_email)
+        with self._pool_lock:
+            pool = self._pool.setdefault(key, queue.Queue())
+        
+        while True:
+            try:
+                entry = pool.get_nowait()
+            except queue.Empty:
+                return [self._connect(sender_email, sender_password), 0]
+            
+            try:
+                if entry[0].noop()[0] == 250:
+                    return entry
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(entry[0])
+    
+    def _release(self, sender_email: str, entry: list) -> None:
+        """Return a session to the pool, recycling it once it has sent too many messages"""
+        if entry[1] >= self.max_messages_per_conn:
+            self._discard(entry[0])
+            return
+        self._pool[self._pool_key(sender_email)].put(entry)
+    
+    def _reset_or_discard(self, sender_email: str, entry: list) -> None:
+        """RSET a session after a rejected message and return it to the pool if still usable"""
+        try:
+            entry[0].rset()
+            self._release(sender_email, entry)
+        except OSError:
+            self._discard(entry[0])
+    
+    @classmethod
+    def close_all(cls) -> None:
+        """Close every pooled SMTP session"""
+        with cls._pool_lock:
+            pools = list(cls._pool.values())
+            cls._pool.clear()
+        
+        for pool in pools:
+            while True:
+                try:
+                    entry = pool.get_nowait()
+                except queue.Empty:
+                    break
+                cls._discard(entry[0])
     
     def send_email(self, 
                    subject: str, 
@@ -76,49 +227,246 @@ class EmailService:
             }
         
         try:
-            # Create message
-            message = MIMEMultipart("alternative")
-            message["Subject"] = subject
-            message["From"] = sender_email
-            message["To"] = ", ".join(recipients)
-            
-            # Add body
-            if is_html:
-                body_part = MIMEText(body, "html")
-            else:
-                body_part = MIMEText(body, "plain")
-            
-            message.attach(body_part)
+            # One envelope for the whole list, so each address gets a single RCPT TO
+            recipients = self._unique_recipients(recipients)
+            message = self._build_message(subject, body, recipients, sender_email, is_html)
             
-            # Create SMTP session
-            with smtplib.SMTP(self.smtp_config["smtp_server"], self.smtp_config["smtp_port"]) as server:
-                if self.smtp_config["use_tls"]:
-                    server.starttls(context=ssl.create_default_context())
-                
-                # Login and send email
-                server.login(sender_email, sender_password)
-                server.sendmail(sender_email, recipients, message.as_string())
+            # Reuse a pooled SMTP session (or open and log in a new one)
+            entry = self._acquire(sender_email, sender_password)
+            try:
+                entry[0].send_message(message, from_addr=sender_email, to_addrs=recipients)
+            except smtplib.SMTPServerDisconnected:
+                # Connection died between the liveness check and DATA; drop it
+                self._discard(entry[0])
+                raise
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # Server rejected this message; the session itself is still usable
+                self._reset_or_discard(sender_email, entry)
+                raise
+            except OSError:
+                self._discard(entry[0])
+                raise
+            entry[1] += 1
+            self._release(sender_email, entry)
             
             return {
                 "success": True,
                 "message": f"Email sent successfully to {len(recipients)} recipient(s)"
             }
             
-        except smtplib.SMTPAuthenticationError:
+        except Exception as e:
+            return self._failure(e)
+    
+    def send_batch(self,
+                   messages: List[Dict],
+                   sender_email: Optional[str] = None,
+                   sender_password: Optional[str] = None) -> List[Dict]:
+        """
+        Send several emails over a single SMTP session
+        
+        Args:
+            messages: List of dicts with "subject", "body", "recipients" and optional "is_html"
+            sender_email: Sender's email (if not provided, uses env variable)
+            sender_password: Sender's password/app password (if not provided, uses env variable)
+            
+        Returns:
+            List of dicts with success status and message, one per input message
+        """
+        
+        sender_email = sender_email or os.getenv("EMAIL_USERNAME")
+        sender_password = sender_password or os.getenv("EMAIL_PASSWORD")
+        
+        if not sender_email or not sender_password:
+            return [{
+                "success": False,
+                "message": "Email credentials not provided. Check EMAIL_USERNAME and EMAIL_PASSWORD in .env file"
+            } for _ in messages]
+        
+        # Build every message up front, so a malformed one fails on its own instead of
+        # aborting the session for the messages after it
+        envelopes, built = [], []
+        for m in messages:
+            try:
+                envelopes.append((m["recipients"], self._serialize(
+                    self._build_message(m["subject"], m["body"], m["recipients"],
+                                        sender_email, m.get("is_html", False))
+                )))
+                built.append(None)
+            except Exception as e:
+                built.append(self._failure(e))
+        
+        sent = iter(self._send_over_session(sender_email, sender_password, envelopes, len(envelopes)))
+        return [next(sent) if failure is None else failure for failure in built]
+    
+    def send_individually(self,
+                          subject: str,
+                          body: str,
+                          recipients: List[str],
+                          sender_email: Optional[str] = None,
+                          sender_password: Optional[str] = None,
+                          is_html: bool = False) -> List[Dict]:
+        """
+        Send the same email separately to each recipient over a single SMTP session
+        
+        The message is serialized once with a placeholder To header and each
+        recipient's address is spliced into the bytes, so the MIME encoding runs
+        once per batch instead of once per recipient.
+        
+        Returns:
+            List of dicts with success status and message, one per recipient
+        """
+        
+        sender_email = sender_email or os.getenv("EMAIL_USERNAME")
+        sender_password = sender_password or os.getenv("EMAIL_PASSWORD")
+        
+        if not sender_email or not sender_password:
+            return [{
+                "success": False,
+                "message": "Email credentials not provided. Check EMAIL_USERNAME and EMAIL_PASSWORD in .env file"
+            } for _ in recipients]
+        
+        # Random per batch, so it can't collide with anything the user typed
+        placeholder = f"to-{secrets.token_hex(16)}@invalid"
+        try:
+            template = self._serialize(
+                self._build_message(subject, body, [placeholder], sender_email, is_html)
+            )
+        except Exception as e:
+            return [self._failure(e) for _ in recipients]
+        
+        # Only the header block is rewritten; the body is sent exactly as serialized
+        headers, sep, rest = template.partition(b"\r\n\r\n")
+        before, _, after = headers.partition(placeholder.encode("ascii"))
+        
+        # Addresses are spliced in as raw header bytes, so only ASCII ones can be sent this way
+        sendable = [to for to in recipients if to.isascii()]
+        envelopes = (([to], b"".join((before, to.encode("ascii"), after, sep, rest))) for to in sendable)
+        sent = iter(self._send_over_session(sender_email, sender_password, envelopes, len(sendable)))
+        
+        return [next(sent) if to.isascii() else {
+            "success": False,
+            "message": f"Recipient address {to} must be ASCII"
+        } for to in recipients]
+    
+    def _send_over_session(self,
+                           sender_email: str,
+                           sender_password: str,
+                           envelopes: Iterable[Tuple[List[str], Union[str, bytes]]],
+                           total: int) -> List[Dict]:
+        """Send (recipients, message) pairs over one pooled SMTP session"""
+        results = []
+        entry = None
+        try:
+            for recipients, payload in envelopes:
+                for attempt in range(2):
+                    if entry is None:
+                        entry = self._acquire(sender_email, sender_password)
+                    elif entry[1] >= self.max_messages_per_conn:
+                        self._discard(entry[0])
+                        entry = self._acquire(sender_email, sender_password)
+                    
+                    try:
+                        entry[0].sendmail(sender_email, recipients, payload)
+                    except smtplib.SMTPServerDisconnected as e:
+                        # Dropped mid-batch; reconnect and retry this message once
+                        self._discard(entry[0])
+                        entry = None
+                        if attempt == 0:
+                            continue
+                        results.append(self._failure(e))
+                        break
+                    except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                        results.append(self._failure(e))
+                    else:
+                        entry[1] += 1
+                        results.append({
+                            "success": True,
+                            "message": f"Email sent successfully to {len(recipients)} recipient(s)"
+                        })
+                    
+                    # Clear the transaction for the next message. Some servers treat RSET
+                    # as QUIT, in which case the next message reconnects transparently.
+                    try:
+                        entry[0].rset()
+                    except smtplib.SMTPServerDisconnected:
+                        self._discard(entry[0])
+                        entry = None
+                    break
+        except Exception as e:
+            failure = self._failure(e)
+            results.extend(failure for _ in range(total - len(results)))
+            if entry is not None:
+                self._discard(entry[0])
+                entry = None
+        finally:
+            if entry is not None:
+                self._release(sender_email, entry)
+        
+        return results
+    
+    @staticmethod
+    def _unique_recipients(recipients: List[str]) -> List[str]:
+        """Strip blanks and case-insensitive duplicates, keeping the original order"""
+        seen = set()
+        unique = []
+        for to in recipients:
+            to = to.strip()
+            if to and to.lower() not in seen:
+                seen.add(to.lower())
+                unique.append(to)
+        return unique
+    
+    @staticmethod
+    def _build_message(subject: str,
+                       body: str,
+                       recipients: List[str],
+                       sender_email: str,
+                       is_html: bool = False) -> MIMEMultipart:
+        """Create the MIME message for an email"""
+        message = MIMEMultipart("alternative")
+        message["Subject"] = subject
+        message["From"] = sender_email
+        message["To"] = ", ".join(recipients)
+        
+        # Add body
+        if is_html:
+            body_part = MIMEText(body, "html")
+        else:
+            body_part = MIMEText(body, "plain")
+        
+        message.attach(body_part)
+        return message
+    
+    @staticmethod
+    def _serialize(message: MIMEMultipart) -> bytes:
+        """Render a message to wire-format bytes with CRLF line endings"""
+        buffer = io.BytesIO()
+        BytesGenerator(buffer, policy=message.policy.clone(linesep="\r\n")).flatten(message)
+        return buffer.getvalue()
+    
+    @staticmethod
+    def _failure(error: Exception) -> Dict:
+        """Map a send error to a failure result, flagging errors worth retrying"""
+        if isinstance(error, smtplib.SMTPAuthenticationError):
             return {
                 "success": False,
                 "message": "Email authentication failed. Check your email and password/app password."
             }
-        except smtplib.SMTPRecipientsRefused:
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
             return {
                 "success": False,
                 "message": "One or more recipients were refused. Check email addresses."
             }
-        except Exception as e:
-            return {
-                "success": False,
-                "message": f"Failed to send email: {str(e)}"
-            }
+        
+        # 4xx replies and dropped connections are temporary; the same send may succeed later
+        transient = isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)) or (
+            isinstance(error, smtplib.SMTPResponseException) and 400 <= error.smtp_code < 500
+        )
+        return {
+            "success": False,
+            "message": f"Failed to send email: {str(error)}",
+            "transient": transient
+        }
     
     def test_connection(self, 
                        sender_email: Optional[str] = None,
@@ -135,10 +483,7 @@ class EmailService:
             }
         
         try:
-            with smtplib.SMTP(self.smtp_config["smtp_server"], self.smtp_config["smtp_port"]) as server:
-                if self.smtp_config["use_tls"]:
-                    server.starttls(context=ssl.create_default_context())
-                server.login(sender_email, sender_password)
+            self._discard(self._connect(sender_email, sender_password))
             
             return {
                 "success": True,
@@ -150,5 +495,180 @@ class EmailService:
                 "message": f"Connection failed: {str(e)}"
             }
 
+class AsyncEmailService:
+    """Asynchronous email service built on aiosmtplib, keeping one session per sender"""
+    
+    def __init__(self, provider: str = "gmail"):
+        self.provider = provider.lower()
+        # Sessions and locks are bound to the event loop that created them, so keep a set per loop
+        self._clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._locks: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    
+    def _loop_clients(self) -> Dict[Tuple, "aiosmtplib.SMTP"]:
+        """Get the open sessions belonging to the running event loop"""
+        return self._clients.setdefault(asyncio.get_running_loop(), {})
+    
+    async def _get_client(self, smtp_config: Dict, sender_email: str, sender_password: str) -> "aiosmtplib.SMTP":
+        """Get a live session for the sender or open and log in a new one"""
+        key = (smtp_config["smtp_server"], smtp_config["smtp_port"], sender_email)
+        clients = self._loop_clients()
+        client = clients.pop(key, None)
+        
+        if client is not None and client.is_connected:
+            try:
+                await client.noop()
+                clients[key] = client
+                return client
+            except Exception:
+                # Dropped or half-open session; discard it and reconnect
+                client.close()
+        
+        use_ssl = bool(smtp_config.get("use_ssl"))
+        endpoint = (smtp_config["smtp_server"], smtp_config["smtp_port"])
+        fallback_port = smtp_config.get("starttls_port") if use_ssl else None
+        
+        client = None
+        if not (fallback_port and endpoint in EmailService._implicit_tls_down):
+            client = aiosmtplib.SMTP(
+                hostname=smtp_config["smtp_server"],
+                port=smtp_config["smtp_port"],
+                use_tls=use_ssl,
+                start_tls=False,
+                tls_context=_SSL_CTX,
+                timeout=SMTP_TIMEOUT
+            )
+            try:
+                await client.connect()
+            except (aiosmtplib.SMTPConnectError, OSError):
+                # Implicit TLS endpoint unreachable; fall back to STARTTLS if the provider has one
+                if not fallback_port:
+                    raise
+                EmailService._implicit_tls_down.add(endpoint)
+                client = None
+        
+        if client is None:
+            # Known-unreachable or just-failed implicit TLS endpoint: use STARTTLS
+            use_ssl = False
+            client = aiosmtplib.SMTP(
+                hostname=smtp_config["smtp_server"],
+                port=fallback_port,
+                start_tls=False,
+                timeout=SMTP_TIMEOUT
+            )
+            await client.connect()
+        
+        if not use_ssl and smtp_config["use_tls"]:
+            await client.starttls(tls_context=_SSL_CTX)
+        await client.login(sender_email, sender_password)
+        
+        clients[key] = client
+        return client
+    
+    async def _send_all(self,
+                        messages: List[Dict],
+                        sender_email: str,
+                        sender_password: str) -> List[Dict]:
+        """Send messages sequentially over the sender's session"""
+        smtp_config = EmailService._get_smtp_config(self.provider)
+        key = (smtp_config["smtp_server"], smtp_config["smtp_port"], sender_email)
+        locks = self._locks.setdefault(asyncio.get_running_loop(), {})
+        lock = locks.setdefault(key, asyncio.Lock())
+        
+        results = []
+        async with lock:
+            for m in messages:
+                try:
+                    client = await self._get_client(smtp_config, sender_email, sender_password)
+                    message = EmailService._build_message(m["subject"], m["body"], m["recipients"],
+                                                          sender_email, m.get("is_html", False))
+                    await client.send_message(message, sender=sender_email, recipients=m["recipients"])
+                    results.append({
+                        "success": True,
+                        "message": f"Email sent successfully to {len(m['recipients'])} recipient(s)"
+                    })
+                except Exception as e:
+                    results.append(self._failure(e))
+        return results
+    
+    async def send_email_async(self,
+                               subject: str,
+                               body: str,
+                               recipients: List[str],
+                               sender_email: Optional[str] = None,
+                               sender_password: Optional[str] = None,
+                               is_html: bool = False) -> Dict:
+        """Send a single email without blocking the event loop"""
+        results = await self.send_batch_async(
+            [{"subject": subject, "body": body, "recipients": recipients, "is_html": is_html}],
+            sender_email=sender_email,
+            sender_password=sender_password
+        )
+        return results[0]
+    
+    async def send_batch_async(self,
+                               messages: List[Dict],
+                               sender_email: Optional[str] = None,
+                               sender_password: Optional[str] = None) -> List[Dict]:
+        """
+        Send several emails over one session through this service's provider
+        
+        Args:
+            messages: List of dicts with "subject", "body", "recipients" and optional "is_html"
+            sender_email: Sender's email (if not provided, uses env variable)
+            sender_password: Sender's password/app password (if not provided, uses env variable)
+            
+        Returns:
+            List of dicts with success status and message, in the same order as messages
+        """
+        
+        if aiosmtplib is None:
+            return [{
+                "success": False,
+                "message": "Async email sending requires aiosmtplib. Install it with: pip install aiosmtplib"
+            } for _ in messages]
+        
+        sender_email = sender_email or os.getenv("EMAIL_USERNAME")
+        sender_password = sender_password or os.getenv("EMAIL_PASSWORD")
+        
+        if not sender_email or not sender_password:
+            return [{
+                "success": False,
+                "message": "Email credentials not provided. Check EMAIL_USERNAME and EMAIL_PASSWORD in .env file"
+            } for _ in messages]
+        
+        return await self._send_all(messages, sender_email, sender_password)
+    
+    async def close_all(self) -> None:
+        """Close every open session belonging to the running event loop"""
+        clients = list(self._loop_clients().values())
+        self._loop_clients().clear()
+        
+        for client in clients:
+            try:
+                await client.quit()
+            except Exception:
+                client.close()
+    
+    @staticmethod
+    def _failure(error: Exception) -> Dict:
+        """Map an aiosmtplib error to a failure result"""
+        if isinstance(error, aiosmtplib.SMTPAuthenticationError):
+            return {
+                "success": False,
+                "message": "Email authentication failed. Check your email and password/app password."
+            }
+        if isinstance(error, (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPRecipientRefused)):
+            return {
+                "success": False,
+                "message": "One or more recipients were refused. Check email addresses."
+            }
+        return {
+            "success": False,
+            "message": f"Failed to send email: {str(error)}"
+        }
+
 # Email service instance
-email_service = EmailService()
\ No newline at end of file
+email_service = EmailService()
+
+# Drain pooled SMTP sessions at interpreter shutdown
+atexit.register(EmailService.close_all)
\ No newline at end of file
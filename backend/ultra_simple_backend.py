@@ -3,17 +3,169 @@
 
 import os
 import json
+import time
+import asyncio
+import threading
 import uuid
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+import math
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Generator, Iterator, Tuple
 import sqlite3
 from pathlib import Path
 import requests
+import httpx
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Background workers for sending email off the request thread
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="email-send")
+SEND_RETRIES = 3
+
+_JSON_DECODER = json.JSONDecoder()
+
+# (connect, read) timeouts for Gemini calls so a stalled connection can't block a worker
+GEMINI_TIMEOUT = (3.05, 15)
+
+# Parsed requirements kept for repeated or retried briefs
+REQUIREMENTS_CACHE_SIZE = 256
+
+# Briefs whose embedding is at least this similar to a recent one reuse its draft
+SIMILAR_DRAFT_THRESHOLD = 0.92
+SIMILAR_DRAFT_WINDOW = 50
+
+# Gemini request body, serialized once; only the prompt text is substituted per call
+_GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "topK": 40,
+    "topP": 0.95,
+    "maxOutputTokens": 1024,
+}
+_GEMINI_BODY_TEMPLATE = (
+    b'{"contents":[{"parts":[{"text":%s}]}],"generationConfig":' + orjson.dumps(_GENERATION_CONFIG) + b'}'
+)
+
+# Prompt templates, filled in with str.format_map
+_PROMPT_PROCESS = """
+        You are an assistant that prepares email drafting requirements.
+        
+        Here is the initial brief:
+        Recipients: {recipients}
+        Purpose: {purpose}
+        Tone: {tone}
+        Constraints: {constraints}
+        
+        Tasks:
+        1. Rephrase the purpose in 4-5 clear sentences.
+        2. Suggest a subject line that matches the purpose and tone.
+        3. List any constraints as actionable rules (max words, tone, etc.).
+        4. Output everything in JSON format with keys: "purpose", "subject_suggestion", "constraints".
+        """
+
+_PROMPT_DRAFT = """
+        Act as a professional email writer. Generate a polite and professional email draft.
+        
+        Context: {context}
+        Purpose: {purpose}
+        Recipients: {recipients}
+        Tone: {tone}
+        Subject: {subject}
+        Constraints: {constraints}
+        
+        Requirements:
+        - Keep it concise (≤150 words for body).
+        - Maintain a {tone} tone.
+        - Include only one clear call-to-action.
+        - End with an appropriate signature placeholder.
+        - Return only the email body (no subject line).
+        - Do not include any formatting markers or extra text.
+        """
+
+_PROMPT_IMPROVE = """
+        You are helping to improve an email draft based on user feedback.
+        
+        Original Draft: {original_draft}
+        User Feedback: {feedback}
+        
+        Email Purpose: {purpose}
+        Tone: {tone}
+        Recipients: {recipients}
+        
+        Please create an improved version that addresses the feedback while maintaining the professional tone and purpose.
+        Return only the improved email body with no extra formatting or explanations.
+        """
+
+# SQL statements, defined once so SQLite's statement cache hits on every call.
+# Timestamps are computed by SQLite in local time, matching rows written by older versions,
+# with millisecond precision so history order is stable.
+_SQL_NOW = "STRFTIME('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+_SQL_INSERT = f'''
+    INSERT OR REPLACE INTO email_history 
+    (id, thread_id, recipients, subject, purpose, tone, draft, status, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, {_SQL_NOW}, {_SQL_NOW})
+'''
+# Same insert, handing back the saved row so callers needn't SELECT it again (SQLite 3.35+)
+_SQL_INSERT_RETURNING = _SQL_INSERT + '''    RETURNING id, thread_id, recipients, subject, purpose, draft, status,
+        SUBSTR(purpose, 1, 25) AS purpose_prefix
+'''
+_SQL_UPDATE = f'''
+    UPDATE email_history 
+    SET status = ?, final_email = ?, updated_at = {_SQL_NOW}
+    WHERE thread_id = ?
+'''
+_SQL_UPDATE_JOB = f'''
+    UPDATE email_history 
+    SET job_status = ?, updated_at = {_SQL_NOW}
+    WHERE thread_id = ?
+'''
+_SQL_HIST = '''
+    SELECT id, thread_id, recipients, subject, purpose, tone, draft, status, created_at
+    FROM email_history 
+    ORDER BY created_at DESC
+    LIMIT ? OFFSET ?
+'''
+_SQL_HIST_SUMMARY = '''
+    SELECT id, subject, SUBSTR(purpose, 1, 25) AS purpose_prefix
+    FROM email_history 
+    ORDER BY created_at DESC
+    LIMIT ? OFFSET ?
+'''
+_SQL_HIST_DETAILS = '''
+    SELECT id, thread_id, recipients, subject, purpose, draft, status
+    FROM email_history 
+    WHERE id IN ({})
+'''
+_SQL_INSERT_DRAFT_CACHE = f'''
+    INSERT INTO draft_cache (embedding, recipients, subject, draft, created_at)
+    VALUES (?, ?, ?, ?, {_SQL_NOW})
+'''
+_SQL_RECENT_DRAFT_CACHE = '''
+    SELECT embedding, subject, draft
+    FROM draft_cache 
+    WHERE recipients = ?
+    ORDER BY id DESC
+    LIMIT ?
+'''
+_SQL_BY_ID = '''
+    SELECT * FROM email_history 
+    WHERE thread_id = ?
+'''
+
+class GeminiTimeoutError(Exception):
+    """Raised when the Gemini API doesn't respond within GEMINI_TIMEOUT, so callers can offer a retry"""
+
+
+class GeminiStreamError(Exception):
+    """Raised when a Gemini stream fails after part of the response was already yielded"""
+
+
 class EmailBrief:
     def __init__(self, recipients: List[str], purpose: str, tone: str = "professional", constraints: Optional[str] = None):
         self.recipients = recipients
@@ -30,15 +182,54 @@ class UltraSimpleEmailService:
             raise ValueError("GOOGLE_API_KEY not found in environment variables")
         
         self.api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={self.api_key}"
+        self.stream_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:streamGenerateContent?alt=sse&key={self.api_key}"
+        self.embed_url = f"https://generativelanguage.googleapis.com/v1beta/models/text-embedding-004:embedContent?key={self.api_key}"
+        
+        # Keep-alive HTTP session so repeated Gemini calls reuse the TCP+TLS connection
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=frozenset(["POST"])
+            )
+        ))
         
         # Setup database
         self.db_path = Path("email_drafting.db")
         self.setup_database()
+        
+        # In-flight and finished background sends, keyed by job id
+        self._jobs: Dict[str, Future] = {}
+        
+        # Parsed (context, subject) per normalized brief, shared by the sync and async paths, least recently used first
+        self._requirements_cache: "OrderedDict[tuple, Tuple[str, str]]" = OrderedDict()
+        self._requirements_lock = threading.Lock()
     
     def setup_database(self):
         """Setup SQLite database for storing email drafts and history"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # One long-lived autocommit connection shared by all threads, serialized by a lock
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        
+        with self._lock:
+            for pragma in (
+                "PRAGMA journal_mode=WAL",
+                "PRAGMA synchronous=NORMAL",
+                "PRAGMA temp_store=MEMORY",
+                "PRAGMA cache_size=-64000",
+            ):
+                self._conn.execute(pragma)
+            
+            self._create_tables()
+    
+    def _create_tables(self):
+        """Create the email history table, migrating older databases"""
+        cursor = self._conn.cursor()
         
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS email_history (
@@ -51,146 +242,382 @@ class UltraSimpleEmailService:
                 draft TEXT,
                 final_email TEXT,
                 status TEXT,
+                job_status TEXT,
                 created_at TIMESTAMP,
                 updated_at TIMESTAMP
             )
         ''')
         
-        conn.commit()
-        conn.close()
+        # Add the job_status column to databases created before background sending
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(email_history)")]
+        if "job_status" not in columns:
+            cursor.execute("ALTER TABLE email_history ADD COLUMN job_status TEXT")
+        
+        # Thread lookups and newest-first history listing
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_thread ON email_history(thread_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_created ON email_history(created_at DESC)")
+        
+        # Embeddings of past briefs (float32 blobs) with the drafts generated for them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS draft_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                embedding BLOB,
+                recipients TEXT,
+                subject TEXT,
+                draft TEXT,
+                created_at TIMESTAMP
+            )
+        ''')
+        
+        # Drafts name their recipients, so only drafts for the same recipients are reused
+        columns = [row[1] for row in cursor.execute("PRAGMA table_info(draft_cache)")]
+        if "recipients" not in columns:
+            cursor.execute("ALTER TABLE draft_cache ADD COLUMN recipients TEXT")
     
-    def call_gemini_api(self, prompt: str) -> str:
-        """Call Google Gemini API directly"""
-        headers = {
-            "Content-Type": "application/json"
-        }
+    def _request_body(self, prompt: str) -> bytes:
+        """Build the serialized Gemini request body for a prompt"""
+        return _GEMINI_BODY_TEMPLATE % orjson.dumps(prompt)
+    
+    @staticmethod
+    def _extract_text(result: Dict[str, Any]) -> str:
+        """Pull the generated text out of a Gemini response"""
+        if 'candidates' in result and len(result['candidates']) > 0:
+            if 'content' in result['candidates'][0]:
+                if 'parts' in result['candidates'][0]['content']:
+                    return result['candidates'][0]['content']['parts'][0]['text']
         
-        data = {
-            "contents": [
-                {
-                    "parts": [
-                        {
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "generationConfig": {
-                "temperature": 0.7,
-                "topK": 40,
-                "topP": 0.95,
-                "maxOutputTokens": 1024,
-            }
-        }
+        return "Error: Could not generate response"
+    
+    @staticmethod
+    def _chunk_text(chunk: Dict[str, Any]) -> str:
+        """Pull the text out of one streamed Gemini chunk, or "" if it has none"""
+        candidates = chunk.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts') or [{}]
+        return parts[0].get('text', "")
+    
+    def call_gemini_api(self, prompt: str) -> Generator[str, None, bool]:
+        """Call Google Gemini API, yielding text chunks as they are generated.
         
+        Errors before any text arrives are yielded as an error message; once text has been
+        yielded, a failure raises GeminiStreamError so a truncated draft can't pass as complete.
+        The generator returns True if Gemini produced the text, False if an error message was yielded.
+        """
+        generated = False
         try:
-            response = requests.post(self.api_url, headers=headers, json=data)
-            response.raise_for_status()
+            with self.session.post(self.stream_url, data=self._request_body(prompt),
+                                   timeout=GEMINI_TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                
+                # Server-sent events: each "data:" line carries one JSON response chunk
+                for line in response.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    text = self._chunk_text(orjson.loads(line[5:]))
+                    if text:
+                        generated = True
+                        yield text
             
-            result = response.json()
+            if not generated:
+                yield "Error: Could not generate response"
+            return generated
             
-            if 'candidates' in result and len(result['candidates']) > 0:
-                if 'content' in result['candidates'][0]:
-                    if 'parts' in result['candidates'][0]['content']:
-                        return result['candidates'][0]['content']['parts'][0]['text']
+        except requests.exceptions.Timeout as e:
+            raise GeminiTimeoutError(f"Gemini did not respond in time: {str(e)}") from e
+        except requests.exceptions.ConnectionError as e:
+            # With stream=True, requests reports a read stall as a ConnectionError wrapping ReadTimeoutError
+            if e.args and isinstance(e.args[0], ReadTimeoutError):
+                raise GeminiTimeoutError(f"Gemini did not respond in time: {str(e)}") from e
+            if generated:
+                raise GeminiStreamError(f"Gemini stream failed: {str(e)}") from e
+            yield f"API Error: {str(e)}"
+            return False
+        except requests.exceptions.RequestException as e:
+            if generated:
+                raise GeminiStreamError(f"Gemini stream failed: {str(e)}") from e
+            yield f"API Error: {str(e)}"
+            return False
+        except Exception as e:
+            if generated:
+                raise GeminiStreamError(f"Gemini stream failed: {str(e)}") from e
+            yield f"Error: {str(e)}"
+            return False
+    
+    def call_gemini_api_full(self, prompt: str) -> str:
+        """Call Google Gemini API and return the complete response text"""
+        return "".join(self.call_gemini_api(prompt))
+    
+    def _async_client(self) -> httpx.AsyncClient:
+        """Create an HTTP/2 client so concurrent Gemini calls share one connection"""
+        return httpx.AsyncClient(
+            http2=True,
+            headers={"Content-Type": "application/json"},
+            timeout=httpx.Timeout(GEMINI_TIMEOUT[1], connect=GEMINI_TIMEOUT[0])
+        )
+    
+    async def call_gemini_api_async(self, prompt: str, client: Optional[httpx.AsyncClient] = None) -> str:
+        """Call Google Gemini API without blocking the event loop"""
+        if client is None:
+            async with self._async_client() as client:
+                return await self.call_gemini_api_async(prompt, client)
+        
+        try:
+            response = await client.post(self.api_url, content=self._request_body(prompt))
+            response.raise_for_status()
             
-            return "Error: Could not generate response"
+            return self._extract_text(orjson.loads(response.content))
             
-        except requests.exceptions.RequestException as e:
+        except httpx.TimeoutException as e:
+            raise GeminiTimeoutError(f"Gemini did not respond in time: {str(e)}") from e
+        except httpx.HTTPError as e:
             return f"API Error: {str(e)}"
         except Exception as e:
             return f"Error: {str(e)}"
     
-    def process_requirements(self, brief: EmailBrief) -> Dict[str, Any]:
-        """Process email requirements and generate context"""
-        prompt = f"""
-        You are an assistant that prepares email drafting requirements.
-        
-        Here is the initial brief:
-        Recipients: {brief.recipients}
-        Purpose: {brief.purpose}
-        Tone: {brief.tone}
-        Constraints: {brief.constraints}
-        
-        Tasks:
-        1. Rephrase the purpose in 4-5 clear sentences.
-        2. Suggest a subject line that matches the purpose and tone.
-        3. List any constraints as actionable rules (max words, tone, etc.).
-        4. Output everything in JSON format with keys: "purpose", "subject_suggestion", "constraints".
-        """
-        
-        response = self.call_gemini_api(prompt)
+    def _requirements_prompt(self, brief: EmailBrief) -> str:
+        """Build the prompt that turns a brief into drafting requirements"""
+        return _PROMPT_PROCESS.format_map({
+            "recipients": brief.recipients,
+            "purpose": brief.purpose,
+            "tone": brief.tone,
+            "constraints": brief.constraints
+        })
+    
+    @staticmethod
+    def _extract_requirements(response: str) -> Tuple[str, str]:
+        """Extract the requirements JSON from a Gemini response as (context, subject); raises if absent"""
+        # Decode the first complete JSON object, ignoring code fences and any surrounding text
+        json_start = response.find('{')
+        if json_start == -1:
+            raise json.JSONDecodeError("No JSON object in response", response, 0)
         
-        # Try to parse JSON from response
+        parsed_context, _ = _JSON_DECODER.raw_decode(response, json_start)
+        if not isinstance(parsed_context, dict):
+            raise json.JSONDecodeError("Expected a JSON object", response, json_start)
+        return orjson.dumps(parsed_context).decode(), parsed_context.get("subject_suggestion", "")
+    
+    @staticmethod
+    def _fallback_requirements(brief: EmailBrief) -> Dict[str, Any]:
+        """Requirements to use when Gemini's response can't be parsed"""
+        subject = f"Regarding: {brief.purpose[:50]}..."
+        return {
+            "context": orjson.dumps({"purpose": brief.purpose, "subject_suggestion": subject}).decode(),
+            "subject": subject
+        }
+    
+    @staticmethod
+    def _brief_key(brief: EmailBrief) -> tuple:
+        """Normalized, hashable form of a brief for caching requirements"""
+        return (
+            tuple(sorted(r.strip() for r in brief.recipients)),
+            brief.purpose.strip(),
+            brief.tone.strip(),
+            brief.constraints.strip() if brief.constraints else None
+        )
+    
+    def _cached_requirements(self, key: tuple) -> Optional[Tuple[str, str]]:
+        """Look up parsed (context, subject) for a normalized brief, marking it recently used"""
+        with self._requirements_lock:
+            cached = self._requirements_cache.get(key)
+            if cached is not None:
+                self._requirements_cache.move_to_end(key)
+            return cached
+    
+    def _cache_requirements(self, key: tuple, requirements: Tuple[str, str]) -> None:
+        """Store parsed requirements, evicting the least recently used entry once full"""
+        with self._requirements_lock:
+            self._requirements_cache[key] = requirements
+            self._requirements_cache.move_to_end(key)
+            if len(self._requirements_cache) > REQUIREMENTS_CACHE_SIZE:
+                self._requirements_cache.popitem(last=False)
+    
+    def _requirements_from_response(self, brief: EmailBrief, key: tuple, response: str) -> Dict[str, Any]:
+        """Parse a requirements response, caching it only if it parsed"""
         try:
-            # Clean the response to extract JSON
-            if '```json' in response:
-                json_start = response.find('```json') + 7
-                json_end = response.find('```', json_start)
-                json_str = response[json_start:json_end].strip()
-            elif '{' in response and '}' in response:
-                json_start = response.find('{')
-                json_end = response.rfind('}') + 1
-                json_str = response[json_start:json_end]
-            else:
-                json_str = response
-            
-            parsed_context = json.loads(json_str)
-            subject = parsed_context.get("subject_suggestion", "")
-        except:
-            subject = f"Regarding: {brief.purpose[:50]}..."
-            parsed_context = {"purpose": brief.purpose, "subject_suggestion": subject}
+            context, subject = self._extract_requirements(response)
+        except json.JSONDecodeError:
+            return self._fallback_requirements(brief)
         
+        self._cache_requirements(key, (context, subject))
         return {
-            "context": json.dumps(parsed_context),
+            "context": context,
             "subject": subject
         }
     
+    def process_requirements(self, brief: EmailBrief) -> Dict[str, Any]:
+        """Process email requirements and generate context, reusing results for identical briefs"""
+        key = self._brief_key(brief)
+        cached = self._cached_requirements(key)
+        if cached is not None:
+            return {"context": cached[0], "subject": cached[1]}
+        
+        response = self.call_gemini_api_full(self._requirements_prompt(brief))
+        return self._requirements_from_response(brief, key, response)
+    
+    def _draft_prompt(self, brief: EmailBrief, context: str, subject: str) -> str:
+        """Build the prompt that writes the email draft"""
+        return _PROMPT_DRAFT.format_map({
+            "context": context,
+            "purpose": brief.purpose,
+            "recipients": ', '.join(brief.recipients),
+            "tone": brief.tone,
+            "subject": subject,
+            "constraints": brief.constraints or 'None'
+        })
+    
     def create_draft(self, brief: EmailBrief, context: str, subject: str) -> Dict[str, Any]:
         """Create email draft"""
-        prompt = f"""
-        Act as a professional email writer. Generate a polite and professional email draft.
+        draft_content = self.call_gemini_api_full(self._draft_prompt(brief, context, subject))
         
-        Context: {context}
-        Purpose: {brief.purpose}
-        Recipients: {', '.join(brief.recipients)}
-        Tone: {brief.tone}
-        Subject: {subject}
-        Constraints: {brief.constraints or 'None'}
+        return {
+            "draft": draft_content.strip(),
+            "subject": subject
+        }
+    
+    async def _requirements_async(self, brief: EmailBrief, client: httpx.AsyncClient) -> Dict[str, Any]:
+        """Process requirements for a brief without blocking the event loop, sharing process_requirements' cache"""
+        key = self._brief_key(brief)
+        cached = self._cached_requirements(key)
+        if cached is not None:
+            return {"context": cached[0], "subject": cached[1]}
         
-        Requirements:
-        - Keep it concise (≤150 words for body).
-        - Maintain a {brief.tone} tone.
-        - Include only one clear call-to-action.
-        - End with an appropriate signature placeholder.
-        - Return only the email body (no subject line).
-        - Do not include any formatting markers or extra text.
-        """
+        response = await self.call_gemini_api_async(self._requirements_prompt(brief), client)
+        return self._requirements_from_response(brief, key, response)
+    
+    async def _create_draft_async(self, brief: EmailBrief, client: httpx.AsyncClient) -> Dict[str, Any]:
+        """Run the requirements and drafting steps for one brief"""
+        requirements = await self._requirements_async(brief, client)
         
-        draft_content = self.call_gemini_api(prompt)
+        prompt = self._draft_prompt(brief, requirements["context"], requirements["subject"])
+        draft_content = await self.call_gemini_api_async(prompt, client)
         
         return {
             "draft": draft_content.strip(),
-            "subject": subject
+            "subject": requirements["subject"],
+            "context": requirements["context"]
         }
     
-    def improve_draft(self, original_draft: str, feedback: str, brief: EmailBrief) -> str:
-        """Improve draft based on feedback"""
-        prompt = f"""
-        You are helping to improve an email draft based on user feedback.
+    @staticmethod
+    def _embedding_text(brief: EmailBrief) -> str:
+        """The parts of a brief that shape the draft, as text to embed"""
+        return f"Purpose: {brief.purpose.strip()}\nTone: {brief.tone}\nConstraints: {brief.constraints or 'None'}"
+    
+    def embed_brief(self, brief: EmailBrief) -> Optional[List[float]]:
+        """Embed a brief with Gemini over the keep-alive session; returns None if the embedding can't be fetched"""
+        body = orjson.dumps({"content": {"parts": [{"text": self._embedding_text(brief)}]}})
+        try:
+            response = self.session.post(self.embed_url, data=body, timeout=GEMINI_TIMEOUT)
+            response.raise_for_status()
+            return orjson.loads(response.content)["embedding"]["values"]
+        except (requests.exceptions.RequestException, KeyError, orjson.JSONDecodeError):
+            return None
+    
+    @staticmethod
+    def _cosine(a, b) -> float:
+        """Cosine similarity of two equal-length vectors"""
+        dot = math.fsum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(math.fsum(x * x for x in a)) * math.sqrt(math.fsum(y * y for y in b))
+        return dot / norm if norm else 0.0
+    
+    @staticmethod
+    def _recipients_key(recipients: List[str]) -> str:
+        """Normalized recipient list, so drafts are only reused for the same people"""
+        return orjson.dumps(sorted({r.strip().lower() for r in recipients})).decode()
+    
+    def find_similar_draft(self, embedding: List[float], recipients: List[str]) -> Optional[Dict[str, Any]]:
+        """Return the most similar recent draft for these recipients above SIMILAR_DRAFT_THRESHOLD, if any"""
+        with self._lock:
+            rows = self._conn.execute(
+                _SQL_RECENT_DRAFT_CACHE, (self._recipients_key(recipients), SIMILAR_DRAFT_WINDOW)
+            ).fetchall()
         
-        Original Draft: {original_draft}
-        User Feedback: {feedback}
+        best, best_score = None, SIMILAR_DRAFT_THRESHOLD
+        for blob, subject, draft in rows:
+            cached = array("f")
+            cached.frombytes(blob)
+            if len(cached) != len(embedding):
+                continue
+            score = self._cosine(embedding, cached)
+            if score >= best_score:
+                best, best_score = {"subject": subject, "draft": draft}, score
+        
+        return best
+    
+    def cache_draft(self, embedding: List[float], recipients: List[str], subject: str, draft: str) -> None:
+        """Remember a generated draft under its brief's embedding and recipients"""
+        with self._lock:
+            self._conn.execute(_SQL_INSERT_DRAFT_CACHE, (
+                array("f", embedding).tobytes(), self._recipients_key(recipients), subject, draft
+            ))
+    
+    def _similar_draft(self, brief: EmailBrief, reuse: bool) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """Embed a brief and look up a similar cached draft, as (embedding, cached draft or None).
         
-        Email Purpose: {brief.purpose}
-        Tone: {brief.tone}
-        Recipients: {', '.join(brief.recipients)}
+        With reuse=False the lookup is skipped but the embedding is still returned, so the fresh
+        draft can be cached.
+        """
+        embedding = self.embed_brief(brief)
+        if embedding is None or not reuse:
+            return embedding, None
+        return embedding, self.find_similar_draft(embedding, brief.recipients)
+    
+    @staticmethod
+    def _collect(stream: Generator[str, None, bool], chunks: List[str]) -> Generator[str, None, bool]:
+        """Re-yield a Gemini stream, appending each chunk to chunks, and pass its return value through"""
+        while True:
+            try:
+                text = next(stream)
+            except StopIteration as stop:
+                return stop.value
+            chunks.append(text)
+            yield text
+    
+    def create_draft_stream(self, brief: EmailBrief, reuse: bool = True) -> Generator[str, None, Dict[str, Any]]:
+        """Process requirements and yield the draft text for one brief as Gemini generates it.
         
-        Please create an improved version that addresses the feedback while maintaining the professional tone and purpose.
-        Return only the improved email body with no extra formatting or explanations.
+        Unless reuse is False, briefs close enough to a recent one for the same recipients reuse
+        its draft instead of calling Gemini. Every call goes over the keep-alive requests session.
+        The generator returns the result dict; its "reused" key says which happened.
         """
+        embedding, cached = self._similar_draft(brief, reuse)
+        if cached:
+            yield cached["draft"]
+            return {**cached, "reused": True}
+        
+        requirements = self.process_requirements(brief)
+        
+        chunks = []
+        prompt = self._draft_prompt(brief, requirements["context"], requirements["subject"])
+        generated = yield from self._collect(self.call_gemini_api(prompt), chunks)
         
-        response = self.call_gemini_api(prompt)
+        result = {
+            "draft": "".join(chunks).strip(),
+            "subject": requirements["subject"],
+            "context": requirements["context"]
+        }
+        # Only drafts Gemini actually produced are reused, never an error message
+        if generated and embedding is not None:
+            self.cache_draft(embedding, brief.recipients, result["subject"], result["draft"])
+        
+        return {**result, "reused": False}
+    
+    async def create_drafts(self, briefs: List[EmailBrief]) -> List[Dict[str, Any]]:
+        """Create drafts for several briefs (e.g. tone variants) concurrently over one HTTP/2 connection"""
+        async with self._async_client() as client:
+            return await asyncio.gather(*[self._create_draft_async(brief, client) for brief in briefs])
+    
+    def _improve_prompt(self, original_draft: str, feedback: str, brief: EmailBrief) -> str:
+        """Build the prompt that revises a draft from user feedback"""
+        return _PROMPT_IMPROVE.format_map({
+            "original_draft": original_draft,
+            "feedback": feedback,
+            "purpose": brief.purpose,
+            "tone": brief.tone,
+            "recipients": ', '.join(brief.recipients)
+        })
+    
+    def improve_draft(self, original_draft: str, feedback: str, brief: EmailBrief) -> str:
+        """Improve draft based on feedback"""
+        response = self.call_gemini_api_full(self._improve_prompt(original_draft, feedback, brief))
         return response.strip()
     
     def send_email(self, subject: str, body: str, recipients: List[str]) -> Dict[str, Any]:
@@ -216,81 +643,178 @@ class UltraSimpleEmailService:
                 "message": f"Error sending email: {str(e)}"
             }
     
-    def save_email(self, thread_id: str, brief: EmailBrief, subject: str, draft: str, status: str = "draft") -> None:
-        """Save email to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def queue_email(self, thread_id: str, subject: str, body: str, recipients: List[str]) -> str:
+        """Queue an email for background sending and return its job id immediately"""
+        job_id = thread_id
+        self._set_job_status(job_id, "queued")
+        self._jobs[job_id] = _executor.submit(self._do_send, job_id, subject, body, recipients)
+        return job_id
+    
+    def _do_send(self, job_id: str, subject: str, body: str, recipients: List[str]) -> Dict[str, Any]:
+        """Send a queued email, retrying transient SMTP failures with backoff"""
+        self._set_job_status(job_id, "sending")
         
-        cursor.execute('''
-            INSERT OR REPLACE INTO email_history 
-            (id, thread_id, recipients, subject, purpose, tone, draft, status, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        for attempt in range(SEND_RETRIES):
+            result = self.send_email(subject, body, recipients)
+            if result["success"] or not result.get("transient"):
+                break
+            if attempt + 1 < SEND_RETRIES:
+                time.sleep(2 ** attempt)
+        
+        if result["success"]:
+            self.update_email_status(job_id, "sent", {
+                "subject": subject,
+                "body": body,
+                "recipients": recipients
+            })
+            self._set_job_status(job_id, "sent")
+        else:
+            self._set_job_status(job_id, "failed")
+        
+        return result
+    
+    def _set_job_status(self, job_id: str, job_status: str) -> None:
+        """Persist background send state for a job"""
+        with self._lock:
+            self._conn.execute(_SQL_UPDATE_JOB, (job_status, job_id))
+    
+    def get_job_status(self, job_id: str) -> Dict[str, Any]:
+        """Get the state of a background send (queued, sending, sent or failed).
+        
+        A finished job's result message is only returned on the first call after it completes.
+        """
+        future = self._jobs.get(job_id)
+        
+        if future is not None and future.done():
+            # Finished jobs are reported once; afterwards the persisted job_status answers
+            self._jobs.pop(job_id, None)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "message": f"Error sending email: {str(e)}"}
+                self._set_job_status(job_id, "failed")
+            return {
+                "job_id": job_id,
+                "status": "sent" if result["success"] else "failed",
+                "message": result["message"]
+            }
+        
+        thread = self.get_thread_by_id(job_id) or {}
+        # Rows sent before background sending have no job_status; their status column says sent
+        status = thread.get("job_status") or ("sent" if thread.get("status") == "sent" else "unknown")
+        return {
+            "job_id": job_id,
+            "status": status,
+            "message": ""
+        }
+    
+    @staticmethod
+    def _history_row(thread_id: str, brief: EmailBrief, subject: str, draft: str, status: str) -> tuple:
+        """Parameters for _SQL_INSERT"""
+        return (
             thread_id,
             thread_id,
-            json.dumps(brief.recipients),
+            orjson.dumps(brief.recipients).decode(),
             subject,
             brief.purpose,
             brief.tone,
             draft,
-            status,
-            datetime.now(),
-            datetime.now()
-        ))
+            status
+        )
+    
+    def save_email(self, thread_id: str, brief: EmailBrief, subject: str, draft: str, status: str = "draft") -> Dict:
+        """Save email to database and return the saved row, shaped like a history details row"""
+        with self._lock:
+            cursor = self._conn.execute(_SQL_INSERT_RETURNING, self._history_row(thread_id, brief, subject, draft, status))
+            
+            columns = [description[0] for description in cursor.description]
+            return self._history_dict(columns, cursor.fetchone())
+    
+    def save_emails_bulk(self, rows: List[Tuple[str, EmailBrief, str, str, str]]) -> None:
+        """Save many (thread_id, brief, subject, draft, status) rows in a single transaction"""
+        params = [self._history_row(*row) for row in rows]
         
-        conn.commit()
-        conn.close()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(_SQL_INSERT, params)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
     
     def update_email_status(self, thread_id: str, status: str, final_email: dict = None):
         """Update email status in database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        final_email_json = orjson.dumps(final_email).decode() if final_email else None
         
-        final_email_json = json.dumps(final_email) if final_email else None
-        
-        cursor.execute('''
-            UPDATE email_history 
-            SET status = ?, final_email = ?, updated_at = ?
-            WHERE thread_id = ?
-        ''', (status, final_email_json, datetime.now(), thread_id))
-        
-        conn.commit()
-        conn.close()
+        with self._lock:
+            self._conn.execute(_SQL_UPDATE, (status, final_email_json, thread_id))
     
-    def get_email_history(self) -> List[Dict]:
-        """Get email history from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM email_history 
-            ORDER BY created_at DESC
-        ''')
-        
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    @staticmethod
+    def _history_dict(columns: List[str], row: tuple) -> Dict:
+        """Build a history row dict with recipients decoded once into recipients_list"""
+        email = dict(zip(columns, row))
+        email["recipients_list"] = orjson.loads(email["recipients"])
+        return email
+    
+    def _select_history(self, limit: Optional[int] = None, offset: int = 0) -> sqlite3.Cursor:
+        """Run the newest-first history query; callers must hold the lock"""
+        return self._conn.execute(_SQL_HIST, (-1 if limit is None else limit, offset))
+    
+    def get_email_history(self, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        """Get email history from database, newest first, optionally one page at a time"""
+        with self._lock:
+            cursor = self._select_history(limit, offset)
+            
+            columns = [description[0] for description in cursor.description]
+            results = [self._history_dict(columns, row) for row in cursor.fetchall()]
         
-        conn.close()
         return results
     
-    def get_thread_by_id(self, thread_id: str) -> Optional[Dict]:
-        """Get specific thread by ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_email_history_summary(self, limit: int, offset: int = 0) -> List[Dict]:
+        """Get just the ids and titles of the newest emails, for rendering the history list quickly"""
+        with self._lock:
+            cursor = self._conn.execute(_SQL_HIST_SUMMARY, (limit, offset))
+            
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def get_email_history_details(self, ids: List[str]) -> Dict[str, Dict]:
+        """Get the full rows for the given history ids, keyed by id"""
+        if not ids:
+            return {}
         
-        cursor.execute('''
-            SELECT * FROM email_history 
-            WHERE thread_id = ?
-        ''', (thread_id,))
+        with self._lock:
+            cursor = self._conn.execute(_SQL_HIST_DETAILS.format(", ".join("?" * len(ids))), tuple(ids))
+            
+            columns = [description[0] for description in cursor.description]
+            rows = [self._history_dict(columns, row) for row in cursor.fetchall()]
         
-        row = cursor.fetchone()
-        if row:
+        return {row["id"]: row for row in rows}
+    
+    def iter_email_history(self, page_size: int = 500) -> Iterator[Dict]:
+        """Stream email history from database, newest first, fetching page_size rows at a time"""
+        with self._lock:
+            cursor = self._select_history()
             columns = [description[0] for description in cursor.description]
-            result = dict(zip(columns, row))
-            conn.close()
-            return result
         
-        conn.close()
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(page_size)
+            if not rows:
+                break
+            yield from (self._history_dict(columns, row) for row in rows)
+    
+    def get_thread_by_id(self, thread_id: str) -> Optional[Dict]:
+        """Get specific thread by ID, with recipients decoded into recipients_list"""
+        with self._lock:
+            cursor = self._conn.execute(_SQL_BY_ID, (thread_id,))
+            
+            row = cursor.fetchone()
+            if row:
+                columns = [description[0] for description in cursor.description]
+                return self._history_dict(columns, row)
+        
         return None
 
 # Initialize the service
@@ -2,8 +2,17 @@
 import streamlit as st
 import sys
 import os
-import json
+import re
+import time
+import hashlib
+from contextlib import contextmanager
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+import pandas as pd
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the backend directory to the Python path
 backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
@@ -11,13 +20,150 @@ sys.path.insert(0, backend_dir)
 
 # Import the simplified service
 from simple_backend import SimpleEmailDraftingService, EmailBrief
+from email_service import email_service as backend_email_service
 import uuid
 
+# Recipients may be pasted one per line or separated by commas/semicolons
+_SPLIT = re.compile(r"[\s,;]+")
+_EMAIL = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+_DEFAULTS = {
+    "current_thread_id": None,
+    "workflow_step": "start",
+    "current_draft": None,
+    "current_subject": None,
+    "show_email_settings": False
+}
+
+# Identical briefs submitted within this many seconds reuse the first run's thread
+_SUBMIT_DEDUPE_SECONDS = 5
+
+# How many recent step timings to keep for the debug panel
+_MAX_TIMINGS = 20
+
+_STEPS = ("📝 Create Brief", "🔐 Get Permission", "✏️ Review Draft", "✅ Complete")
+_STEP_INDEX = {
+    "start": 0,
+    "loaded_from_history": 0,
+    "awaiting_permission": 1,
+    "awaiting_approval": 2,
+    "request_changes": 2,
+    "completed": 3
+}
+
 # Initialize the service
 @st.cache_resource
 def get_email_service():
     return SimpleEmailDraftingService()
 
+# Keep history on disk across restarts unless the DB is edited out-of-band (HISTORY_CACHE_PERSIST=0).
+# Persisted caches don't support TTL, so staleness is bounded by _invalidate_caches() instead.
+_HISTORY_PERSIST = "disk" if os.getenv("HISTORY_CACHE_PERSIST", "1") == "1" else None
+
+# Cache history between reruns; the service arg is underscored so Streamlit doesn't hash it
+@st.cache_data(ttl=None if _HISTORY_PERSIST else 60, persist=_HISTORY_PERSIST, show_spinner=False)
+def _cached_history(_svc):
+    # Timed here, so only cache misses (real service calls) show up in the debug panel
+    with _timed("get_email_history"):
+        history = _svc.get_email_history()
+    # Decode recipients once per fetch instead of on every sidebar rerun
+    for email in history:
+        email['recipients_list'] = loads(email['recipients'])
+    return history
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_history_frame(_svc):
+    """History as a DataFrame for the sidebar table"""
+    history = _cached_history(_svc)
+    return pd.DataFrame({
+        "subject": [email['subject'] or email['purpose'] for email in history],
+        "recipients": [", ".join(email['recipients_list']) for email in history],
+        "status": [email['status'] for email in history],
+        "created_at": [email['created_at'] for email in history],
+        "thread_id": [email['thread_id'] for email in history],
+    })
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_thread(_svc, thread_id: str):
+    with _timed("get_thread_by_id"):
+        return _svc.get_thread_by_id(thread_id)
+
+@st.cache_resource
+def _send_executor():
+    """Shared worker pool so SMTP sends don't block the script run"""
+    return ThreadPoolExecutor(max_workers=4)
+
+def _invalidate_caches():
+    """Drop cached history and threads after the workflow writes to the database"""
+    _cached_history.clear()
+    _cached_history_frame.clear()
+    _cached_thread.clear()
+
+def _send_and_record(email_service, thread_id: str, final_email: dict) -> dict:
+    """Send on a worker thread and record success there, so it's saved even if the user leaves the page"""
+    result = backend_email_service.send_email(
+        subject=final_email.get('subject', ''),
+        body=final_email.get('body', ''),
+        recipients=final_email.get('recipients', [])
+    )
+    if result['success']:
+        email_service.update_email_status({'thread_id': thread_id}, 'sent')
+        _invalidate_caches()
+    return result
+
+@st.fragment(run_every=1)
+def _poll_send_future():
+    """Report the background send's outcome once it finishes"""
+    future = st.session_state.get('send_future')
+    if future is None:
+        return
+    
+    if not future.done():
+        st.info("📤 Sending email in the background...")
+        # Blocking on the future is opt-in
+        if not st.button("🔄 Check Status", use_container_width=True):
+            return
+    
+    try:
+        result = future.result()
+    except Exception as e:
+        result = {"success": False, "message": str(e)}
+    
+    st.session_state.send_future = None
+    if result['success']:
+        # The worker already recorded the send; just pick up the new status
+        _invalidate_caches()
+        st.session_state.send_error = None
+    else:
+        st.session_state.send_error = result['message']
+    st.rerun()
+
+@contextmanager
+def _timed(label: str):
+    """Record how long a service call took in session_state for the debug panel"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = st.session_state.setdefault("_timings", [])
+        timings.append((label, time.perf_counter() - t0))
+        del timings[:-_MAX_TIMINGS]
+
+def _continue_workflow_streaming(email_service, thread_id: str, decision: str, feedback=None, spinner_text: str = "Working..."):
+    """Stream draft tokens into the page, falling back to the blocking call when the service can't stream"""
+    stream = getattr(email_service, "continue_workflow_stream", None)
+    if stream is None:
+        with st.spinner(spinner_text), _timed("continue_workflow"):
+            return email_service.continue_workflow(thread_id, decision, feedback)
+    
+    result = {}
+    def _tokens():
+        # The generator's return value carries the final workflow state
+        result.update((yield from stream(thread_id, decision, feedback)) or {})
+    with _timed("continue_workflow_stream"):
+        st.empty().write_stream(_tokens())
+    return result
+
 def main():
     st.set_page_config(
         page_title="AI Email Drafting Assistant",
@@ -28,50 +174,18 @@ def main():
     st.title("📧 AI Email Drafting Assistant")
     st.markdown("---")
     
-    email_service = get_email_service()
+    # Keep the service handle in session_state so reruns skip the resource-cache lookup
+    if "_svc" not in st.session_state:
+        st.session_state["_svc"] = get_email_service()
+    email_service = st.session_state["_svc"]
     
     # Initialize session state
-    if "current_thread_id" not in st.session_state:
-        st.session_state.current_thread_id = None
-    if "workflow_step" not in st.session_state:
-        st.session_state.workflow_step = "start"
-    if "current_draft" not in st.session_state:
-        st.session_state.current_draft = None
-    if "current_subject" not in st.session_state:
-        st.session_state.current_subject = None
-    if "show_email_settings" not in st.session_state:
-        st.session_state.show_email_settings = False
+    for key, value in _DEFAULTS.items():
+        st.session_state.setdefault(key, value)
     
     # Sidebar for navigation and history
     with st.sidebar:
-        st.header("📁 Email History")
-        
-        # Load previous emails button
-        if st.button("🔄 Refresh History", use_container_width=True):
-            st.rerun()
-        
-        # Get email history
-        history = email_service.get_email_history()
-        
-        if history:
-            st.subheader("Previous Emails")
-            for email in history[:10]:  # Show last 10 emails
-                with st.expander(f"📧 {email['subject'][:30]}..." if email['subject'] else f"📧 {email['purpose'][:30]}..."):
-                    st.write(f"**Recipients:** {json.loads(email['recipients'])}")
-                    st.write(f"**Purpose:** {email['purpose']}")
-                    st.write(f"**Status:** {email['status']}")
-                    st.write(f"**Created:** {email['created_at']}")
-                    
-                    if st.button(f"Load Thread", key=f"load_{email['id']}"):
-                        st.session_state.current_thread_id = email['thread_id']
-                        thread_data = email_service.get_thread_by_id(email['thread_id'])
-                        if thread_data:
-                            st.session_state.current_draft = thread_data['draft']
-                            st.session_state.current_subject = thread_data['subject']
-                            st.session_state.workflow_step = "loaded_from_history"
-                        st.rerun()
-        else:
-            st.info("No email history found.")
+        _render_sidebar(email_service)
     
     # Main content area
     col1, col2 = st.columns([2, 1])
@@ -90,6 +204,53 @@ def main():
     with col2:
         show_workflow_status()
 
+@st.fragment
+def _render_sidebar(email_service):
+    """Render email history; runs as a fragment so main-panel clicks skip it"""
+    st.header("📁 Email History")
+    
+    # Load previous emails button
+    if st.button("🔄 Refresh History", use_container_width=True):
+        _cached_history.clear()
+        _cached_history_frame.clear()
+        # Only the sidebar needs refetching
+        st.rerun(scope="fragment")
+    
+    # Get email history
+    history = _cached_history_frame(email_service)
+    
+    if not history.empty:
+        st.subheader("Previous Emails")
+        # One table widget instead of an expander and button per email
+        event = st.dataframe(
+            history.head(10),  # Show last 10 emails
+            key="history_select",
+            on_select="rerun",
+            selection_mode="single-row",
+            hide_index=True,
+            column_order=("subject", "recipients", "status", "created_at"),
+            use_container_width=True
+        )
+        
+        rows = event.selection.rows
+        if rows:
+            thread_id = history.iloc[rows[0]]['thread_id']
+            # Selection persists across reruns; only load when it changes
+            if thread_id != st.session_state.get('history_loaded'):
+                st.session_state.history_loaded = thread_id
+                st.session_state.current_thread_id = thread_id
+                thread_data = _cached_thread(email_service, thread_id)
+                if thread_data:
+                    st.session_state.current_draft = thread_data['draft']
+                    st.session_state.current_subject = thread_data['subject']
+                    st.session_state.workflow_step = "loaded_from_history"
+                st.rerun()
+        else:
+            # Deselected: let the same thread be loaded again when it is reselected
+            st.session_state.history_loaded = None
+    else:
+        st.info("No email history found.")
+
 def show_email_creation_form(email_service):
     """Show the initial email creation form"""
     st.header("✉️ Create New Email")
@@ -98,9 +259,9 @@ def show_email_creation_form(email_service):
         st.subheader("Email Details")
         
         recipients = st.text_area(
-            "📬 Recipients (one per line)",
+            "📬 Recipients (one per line, or separated by commas/semicolons)",
             placeholder="john.doe@company.com\njane.smith@company.com",
-            help="Enter email addresses, one per line"
+            help="Enter email addresses one per line, or separate them with commas, semicolons or spaces"
         )
         
         purpose = st.text_area(
@@ -147,7 +308,11 @@ def show_email_creation_form(email_service):
                 return
             
             # Parse recipients
-            recipient_list = [email.strip() for email in recipients.split('\n') if email.strip()]
+            recipient_list = [e for e in _SPLIT.split(recipients) if e]
+            invalid = [e for e in recipient_list if not _EMAIL.fullmatch(e)]
+            if invalid:
+                st.error(f"Invalid email address(es): {', '.join(invalid)}")
+                return
             
             # Create email brief
             brief = EmailBrief(
@@ -157,11 +322,28 @@ def show_email_creation_form(email_service):
                 constraints=constraints if constraints else None
             )
             
+            # Skip the LLM run when the same brief was just submitted
+            submit_hash = hashlib.blake2b(
+                f"{tuple(recipient_list)}|{purpose}|{tone}|{constraints}".encode(),
+                digest_size=16
+            ).hexdigest()
+            submit_hashes = st.session_state.setdefault("_submit_hashes", {})
+            submitted_at, previous_thread = submit_hashes.get(submit_hash, (0, None))
+            if previous_thread and time.time() - submitted_at < _SUBMIT_DEDUPE_SECONDS:
+                st.session_state.current_thread_id = previous_thread
+                st.session_state.workflow_step = "awaiting_permission"
+                st.rerun()
+            
             # Start workflow
-            with st.spinner("Processing your request..."):
+            with st.spinner("Processing your request..."), _timed("run_workflow"):
                 thread_id = email_service.run_workflow(brief)
-                st.session_state.current_thread_id = thread_id
-                st.session_state.workflow_step = "awaiting_permission"
+            submit_hashes[submit_hash] = (time.time(), thread_id)
+            
+            _invalidate_caches()
+            st.session_state.current_thread_id = thread_id
+            # run_workflow only returns the thread id; the permission step fills this in once
+            st.session_state.current_context = None
+            st.session_state.workflow_step = "awaiting_permission"
             
             st.success("Email requirements processed!")
             st.rerun()
@@ -171,11 +353,15 @@ def show_permission_form(email_service):
     st.header("🔐 Permission Request")
     
     if st.session_state.current_thread_id:
-        # Get current workflow state
-        config = {"configurable": {"thread_id": st.session_state.current_thread_id}}
         try:
-            current_state = email_service.workflow.get_state(config)
-            context = current_state.values.get("context", "")
+            # Context only changes on workflow transitions, so read the checkpointer once per step
+            context = st.session_state.get("current_context")
+            if context is None:
+                config = {"configurable": {"thread_id": st.session_state.current_thread_id}}
+                with _timed("get_state"):
+                    current_state = email_service.workflow.get_state(config)
+                context = current_state.values.get("context", "")
+                st.session_state.current_context = context
             
             st.info(context)
             
@@ -183,14 +369,17 @@ def show_permission_form(email_service):
             
             with col1:
                 if st.button("✅ Approve - Create Draft", use_container_width=True):
-                    with st.spinner("Creating email draft..."):
-                        result = email_service.continue_workflow(
-                            st.session_state.current_thread_id, 
-                            "approved"
-                        )
-                        st.session_state.current_draft = result.get("draft")
-                        st.session_state.current_subject = result.get("subject")
-                        st.session_state.workflow_step = "awaiting_approval"
+                    result = _continue_workflow_streaming(
+                        email_service,
+                        st.session_state.current_thread_id, 
+                        "approved",
+                        spinner_text="Creating email draft..."
+                    )
+                    _invalidate_caches()
+                    st.session_state.current_context = result.get("context", "")
+                    st.session_state.current_draft = result.get("draft")
+                    st.session_state.current_subject = result.get("subject")
+                    st.session_state.workflow_step = "awaiting_approval"
                     st.success("Draft created!")
                     st.rerun()
             
@@ -205,6 +394,21 @@ def show_permission_form(email_service):
             st.error(f"Error getting workflow state: {str(e)}")
             st.session_state.workflow_step = "start"
 
+@st.fragment
+def _draft_preview(subject, body):
+    """Read-only draft preview, isolated so review-page clicks don't rebuild it"""
+    # Subject
+    if subject:
+        st.text_input("Subject:", value=subject, disabled=True)
+    
+    # Body
+    st.text_area(
+        "Email Body:",
+        value=body,
+        height=200,
+        disabled=True
+    )
+
 def show_approval_form(email_service):
     """Show draft approval form"""
     st.header("✏️ Review Email Draft")
@@ -212,18 +416,7 @@ def show_approval_form(email_service):
     if st.session_state.current_draft:
         # Display the draft
         st.subheader("📄 Email Preview")
-        
-        # Subject
-        if st.session_state.current_subject:
-            st.text_input("Subject:", value=st.session_state.current_subject, disabled=True)
-        
-        # Body
-        st.text_area(
-            "Email Body:",
-            value=st.session_state.current_draft,
-            height=200,
-            disabled=True
-        )
+        _draft_preview(st.session_state.current_subject, st.session_state.current_draft)
         
         st.markdown("---")
         st.subheader("📝 Your Decision")
@@ -232,11 +425,13 @@ def show_approval_form(email_service):
         
         with col1:
             if st.button("✅ Approve & Send", use_container_width=True):
-                with st.spinner("Preparing email for sending..."):
+                with st.spinner("Preparing email for sending..."), _timed("continue_workflow"):
                     result = email_service.continue_workflow(
                         st.session_state.current_thread_id, 
                         "approved"
                     )
+                    _invalidate_caches()
+                    st.session_state.current_context = result.get("context", "")
                     st.session_state.workflow_step = "completed"
                 st.success("Email approved and prepared!")
                 st.rerun()
@@ -268,14 +463,17 @@ def show_approval_form(email_service):
         with col1:
             if st.button("🔄 Regenerate Draft", use_container_width=True):
                 if feedback.strip():
-                    with st.spinner("Creating improved draft..."):
-                        result = email_service.continue_workflow(
-                            st.session_state.current_thread_id, 
-                            "needs_changes",
-                            feedback
-                        )
-                        st.session_state.current_draft = result.get("draft")
-                        st.session_state.workflow_step = "awaiting_approval"
+                    result = _continue_workflow_streaming(
+                        email_service,
+                        st.session_state.current_thread_id, 
+                        "needs_changes",
+                        feedback,
+                        spinner_text="Creating improved draft..."
+                    )
+                    _invalidate_caches()
+                    st.session_state.current_context = result.get("context", "")
+                    st.session_state.current_draft = result.get("draft")
+                    st.session_state.workflow_step = "awaiting_approval"
                     st.success("New draft created!")
                     st.rerun()
                 else:
@@ -292,10 +490,10 @@ def show_completion_status(email_service):
     
     if st.session_state.current_thread_id:
         # Get final email from database
-        thread_data = email_service.get_thread_by_id(st.session_state.current_thread_id)
+        thread_data = _cached_thread(email_service, st.session_state.current_thread_id)
+        final_email = loads(thread_data['final_email']) if thread_data and thread_data.get('final_email') else None
         
-        if thread_data and thread_data.get('final_email'):
-            final_email = json.loads(thread_data['final_email'])
+        if final_email:
             
             # Check if email was actually sent
             if thread_data.get('status') == 'sent':
@@ -313,35 +511,39 @@ def show_completion_status(email_service):
             # Show send status
             if thread_data.get('status') == 'sent':
                 st.success(f"✅ Sent successfully to {len(final_email.get('recipients', []))} recipient(s)")
+                
+                # Nothing left to retry or configure once the email is out
+                if st.button("📝 Create Another Email", use_container_width=True):
+                    st.session_state.current_thread_id = None
+                    st.session_state.workflow_step = "start"
+                    st.session_state.current_draft = None
+                    st.session_state.current_subject = None
+                    st.rerun()
+                return
             elif thread_data.get('status') == 'send_failed':
                 st.error("❌ Email sending failed. Check your email configuration.")
                 
+                if st.session_state.get('send_error'):
+                    st.error(f"❌ Still failed: {st.session_state.send_error}")
+                
                 # Option to retry sending
-                if st.button("🔄 Retry Sending", use_container_width=True):
-                    with st.spinner("Retrying email send..."):
-                        # Re-attempt sending
-                        from backend.email_service import email_service as es
-                        result = es.send_email(
-                            subject=final_email.get('subject', ''),
-                            body=final_email.get('body', ''),
-                            recipients=final_email.get('recipients', [])
-                        )
-                        if result['success']:
-                            email_service.update_email_status(
-                                {'thread_id': st.session_state.current_thread_id}, 
-                                'sent'
-                            )
-                            st.success("✅ Email sent successfully!")
-                            st.rerun()
-                        else:
-                            st.error(f"❌ Still failed: {result['message']}")
+                if st.session_state.get('send_future'):
+                    _poll_send_future()
+                elif st.button("🔄 Retry Sending", use_container_width=True):
+                    # Re-attempt sending in the background
+                    st.session_state.send_future = _send_executor().submit(
+                        _send_and_record,
+                        email_service,
+                        st.session_state.current_thread_id,
+                        final_email
+                    )
+                    st.rerun()
         
         col1, col2, col3 = st.columns(3)
         
         with col1:
             if st.button("📧 Copy Email Content", use_container_width=True):
-                if thread_data and thread_data.get('final_email'):
-                    final_email = json.loads(thread_data['final_email'])
+                if final_email:
                     email_content = f"Subject: {final_email.get('subject', '')}\n\n{final_email.get('body', '')}"
                     st.code(email_content)
                     st.info("Email content displayed above. Copy manually from the code block.")
@@ -373,8 +575,8 @@ def show_email_settings():
     with col1:
         if st.button("🔗 Test Email Connection", use_container_width=True):
             with st.spinner("Testing email connection..."):
-                from backend.email_service import email_service as es
-                result = es.test_connection()
+                with _timed("test_connection"):
+                    result = backend_email_service.test_connection()
                 if result['success']:
                     st.success(result['message'])
                 else:
@@ -415,24 +617,18 @@ def show_email_settings():
         help="Select your email provider"
     )
 
+@st.fragment
 def show_workflow_status():
     """Show current workflow status"""
     st.subheader("📊 Workflow Status")
     
-    steps = [
-        ("📝 Create Brief", "start"),
-        ("🔐 Get Permission", "awaiting_permission"),
-        ("✏️ Review Draft", "awaiting_approval"),
-        ("✅ Complete", "completed")
-    ]
+    current = _STEP_INDEX.get(st.session_state.workflow_step, 0)
     
-    current_step = st.session_state.workflow_step
-    
-    for i, (step_name, step_key) in enumerate(steps):
-        if step_key == current_step or (current_step == "loaded_from_history" and step_key == "start"):
-            st.success(f"➡️ {step_name}")
-        elif i < len(steps) - 1 and steps[i + 1][1] == current_step:
+    for i, step_name in enumerate(_STEPS):
+        if i < current:
             st.success(f"✅ {step_name}")
+        elif i == current:
+            st.success(f"➡️ {step_name}")
         else:
             st.info(f"⏸️ {step_name}")
     
@@ -444,6 +640,12 @@ def show_workflow_status():
         st.markdown("**Draft Status:** 📄 Draft Ready")
         with st.expander("Preview Current Draft"):
             st.text_area("", value=st.session_state.current_draft, height=100, disabled=True)
+    
+    # Recent service-call latencies, newest first
+    if st.session_state.get("_timings"):
+        with st.expander("⏱ Debug Timings"):
+            for label, seconds in reversed(st.session_state._timings):
+                st.write(f"**{label}:** {seconds * 1000:.0f} ms")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
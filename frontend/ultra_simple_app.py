@@ -2,7 +2,6 @@
 import streamlit as st
 import sys
 import os
-import json
 import uuid
 from datetime import datetime
 
@@ -22,6 +21,46 @@ def get_email_service():
         st.info("Make sure GOOGLE_API_KEY is set in your .env file")
         st.stop()
 
+HISTORY_PAGE_SIZE = 5
+
+# Fresh-session state; thread_id is generated on first use by the Create handler
+_DEFAULTS = {
+    "current_step": "create",
+    "current_draft": None,
+    "current_subject": None,
+    "current_brief": None,
+    "thread_id": None
+}
+
+# Cache the sidebar history between reruns; the service arg is underscored so Streamlit doesn't hash it.
+# The page of ids comes from a cheap summary query; full rows are fetched for just those ids.
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_history_summary(_svc, limit=5):
+    return _svc.get_email_history_summary(limit)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_history_details(_svc, ids: tuple):
+    return _svc.get_email_history_details(list(ids))
+
+def clear_history_cache():
+    """Drop cached history after anything writes to the database"""
+    fetch_history_summary.clear()
+    fetch_history_details.clear()
+    st.session_state.pop('saved_since_fetch', None)
+
+def merge_saved_since_fetch(history, limit):
+    """Put rows returned by creates since the cache was filled at the top, so the sidebar needn't reread them"""
+    saved = st.session_state.get('saved_since_fetch')
+    if not saved:
+        return history, {}
+    
+    # Newest first; a thread saved twice keeps only its latest row
+    latest = {}
+    for email in reversed(saved):
+        latest.setdefault(email['id'], email)
+    history = list(latest.values()) + [email for email in history if email['id'] not in latest]
+    return history[:limit], latest
+
 def main():
     st.set_page_config(
         page_title="AI Email Drafting Assistant",
@@ -36,47 +75,19 @@ def main():
     email_service = get_email_service()
     
     # Initialize session state
-    if "current_step" not in st.session_state:
-        st.session_state.current_step = "create"
-    if "current_draft" not in st.session_state:
-        st.session_state.current_draft = None
-    if "current_subject" not in st.session_state:
-        st.session_state.current_subject = None
-    if "current_brief" not in st.session_state:
-        st.session_state.current_brief = None
-    if "thread_id" not in st.session_state:
-        st.session_state.thread_id = str(uuid.uuid4())
+    new_session = "current_step" not in st.session_state
+    for key, value in _DEFAULTS.items():
+        st.session_state.setdefault(key, value)
+    
+    if new_session:
+        # Pick up the draft named in the URL, if any
+        restore_thread_from_url(email_service)
+    
+    sync_query_params()
     
     # Sidebar for history
     with st.sidebar:
-        st.header("📁 Email History")
-        
-        if st.button("🔄 Refresh", use_container_width=True):
-            st.rerun()
-        
-        history = email_service.get_email_history()
-        
-        if history:
-            for email in history[:5]:  # Show last 5 emails
-                with st.expander(f"📧 {email['subject'][:25]}..." if email['subject'] else f"📧 {email['purpose'][:25]}..."):
-                    st.write(f"**To:** {json.loads(email['recipients'])}")
-                    st.write(f"**Purpose:** {email['purpose'][:50]}...")
-                    st.write(f"**Status:** {email['status']}")
-                    
-                    if st.button(f"Load", key=f"load_{email['id']}", use_container_width=True):
-                        st.session_state.current_draft = email['draft']
-                        st.session_state.current_subject = email['subject']
-                        st.session_state.thread_id = email['thread_id']
-                        st.session_state.current_step = "review"
-                        st.rerun()
-        else:
-            st.info("No history yet")
-        
-        # Email settings
-        st.markdown("---")
-        st.subheader("⚙️ Email Settings")
-        if st.button("🔗 Test Connection", use_container_width=True):
-            test_email_connection()
+        render_history_sidebar(email_service)
     
     # Main content
     if st.session_state.current_step == "create":
@@ -84,43 +95,129 @@ def main():
     elif st.session_state.current_step == "review":
         show_review_form(email_service)
     elif st.session_state.current_step == "sent":
-        show_sent_status()
+        show_sent_status(email_service)
+
+def restore_thread_from_url(email_service):
+    """Reload the draft for ?thread_id=... from the database instead of regenerating it"""
+    thread_id = st.query_params.get("thread_id")
+    if not thread_id:
+        return
+    
+    thread = email_service.get_thread_by_id(thread_id)
+    if not thread or not thread["draft"]:
+        return
+    
+    st.session_state.thread_id = thread_id
+    st.session_state.current_brief = EmailBrief(
+        recipients=thread["recipients_list"],
+        purpose=thread["purpose"],
+        tone=thread["tone"]
+    )
+    st.session_state.current_draft = thread["draft"]
+    st.session_state.current_subject = thread["subject"]
+    st.session_state.current_step = "sent" if thread["status"] == "sent" else "review"
+
+def sync_query_params():
+    """Keep the URL pointing at the open draft so a reload or shared link can restore it"""
+    if st.session_state.current_step == "create":
+        st.query_params.pop("thread_id", None)
+    elif st.query_params.get("thread_id") != st.session_state.thread_id:
+        st.query_params["thread_id"] = st.session_state.thread_id
+
+@st.fragment
+def render_history_sidebar(email_service):
+    """Render the history sidebar; runs as a fragment so main-area edits don't rerun it"""
+    st.header("📁 Email History")
+    
+    if st.button("🔄 Refresh", use_container_width=True):
+        clear_history_cache()
+        st.rerun(scope="fragment")
+    
+    page = st.session_state.get('history_page', 1)
+    history = fetch_history_summary(email_service, HISTORY_PAGE_SIZE * page)
+    # Keyed on the cached summary's ids so a merged-in draft doesn't miss the details cache
+    cached_ids = tuple(email['id'] for email in history)
+    # Drafts created this session but not yet in the cached summary
+    history, saved_details = merge_saved_since_fetch(history, HISTORY_PAGE_SIZE * page)
+    
+    if history:
+        # Each expander is drawn once from the cached rows, so open ones stay open across reruns
+        details = {**fetch_history_details(email_service, cached_ids), **saved_details}
+        for email in history:
+            title = f"📧 {email['subject'][:25]}..." if email['subject'] else f"📧 {email['purpose_prefix']}..."
+            email = details.get(email['id'])
+            if not email:
+                continue
+            with st.expander(title):
+                st.write(f"**To:** {email['recipients_list']}")
+                st.write(f"**Purpose:** {email['purpose'][:50]}...")
+                st.write(f"**Status:** {email['status']}")
+                
+                if st.button(f"Load", key=f"load_{email['id']}", use_container_width=True):
+                    st.session_state.current_draft = email['draft']
+                    st.session_state.current_subject = email['subject']
+                    st.session_state.thread_id = email['thread_id']
+                    st.session_state.current_step = "review"
+                    st.rerun()
+        
+        # A full page means there may be older emails to show
+        if len(history) == HISTORY_PAGE_SIZE * page:
+            if st.button("⬇️ Load more", use_container_width=True):
+                st.session_state.history_page = page + 1
+                st.rerun(scope="fragment")
+    else:
+        st.info("No history yet")
+    
+    # Email settings
+    st.markdown("---")
+    st.subheader("⚙️ Email Settings")
+    if st.button("🔗 Test Connection", use_container_width=True):
+        test_email_connection()
 
 def show_create_form(email_service):
     """Show email creation form"""
     st.header("✉️ Create New Email")
     
-    col1, col2 = st.columns([2, 1])
-    
-    with col1:
-        recipients = st.text_area(
-            "📬 Recipients (one per line)",
-            placeholder="john.doe@company.com\njane.smith@company.com",
-            height=80
-        )
+    # A form holds the inputs until submit, so typing doesn't rerun the script
+    with st.form("create_form"):
+        col1, col2 = st.columns([2, 1])
         
-        purpose = st.text_area(
-            "🎯 What do you want to communicate?",
-            placeholder="I need to schedule a team meeting for next week to discuss the project timeline...",
-            height=120
-        )
-    
-    with col2:
-        tone = st.selectbox(
-            "🎭 Tone", 
-            ["professional", "friendly", "formal", "casual", "urgent"],
-            help="How should the email sound?"
-        )
+        with col1:
+            recipients = st.text_area(
+                "📬 Recipients (one per line)",
+                placeholder="john.doe@company.com\njane.smith@company.com",
+                height=80
+            )
+            
+            purpose = st.text_area(
+                "🎯 What do you want to communicate?",
+                placeholder="I need to schedule a team meeting for next week to discuss the project timeline...",
+                height=120
+            )
         
-        constraints = st.text_input(
-            "📏 Special requests (optional)", 
-            placeholder="Keep it short, mention deadline, etc."
-        )
+        with col2:
+            tone = st.selectbox(
+                "🎭 Tone", 
+                ["professional", "friendly", "formal", "casual", "urgent"],
+                help="How should the email sound?"
+            )
+            
+            constraints = st.text_input(
+                "📏 Special requests (optional)", 
+                placeholder="Keep it short, mention deadline, etc."
+            )
+            
+            fresh = st.checkbox(
+                "🎲 Write a fresh draft",
+                help="Don't reuse a similar earlier draft for the same recipients"
+            )
+        
+        submitted = st.form_submit_button("🚀 Create Email Draft", use_container_width=True, type="primary")
     
     col_create, col_reset = st.columns(2)
     
     with col_create:
-        if st.button("🚀 Create Email Draft", use_container_width=True, type="primary"):
+        if submitted:
             if not recipients.strip():
                 st.error("Please enter at least one recipient")
                 return
@@ -139,25 +236,27 @@ def show_create_form(email_service):
             
             with st.spinner("🤖 AI is creating your email draft..."):
                 try:
-                    # Process requirements
-                    req_result = email_service.process_requirements(brief)
-                    
-                    # Create draft
-                    draft_result = email_service.create_draft(brief, req_result["context"], req_result["subject"])
+                    # Show the draft as it is generated; the stream's return value is the full result
+                    draft_result = {}
+                    def _tokens():
+                        draft_result.update((yield from email_service.create_draft_stream(brief, reuse=not fresh)))
+                    st.write_stream(_tokens())
                     
                     # Save to session
+                    st.session_state.thread_id = st.session_state.thread_id or str(uuid.uuid4())
                     st.session_state.current_brief = brief
                     st.session_state.current_draft = draft_result["draft"]
                     st.session_state.current_subject = draft_result["subject"]
                     st.session_state.current_step = "review"
+                    st.session_state.draft_reused = draft_result["reused"]
                     
-                    # Save to database
-                    email_service.save_email(
+                    # Save to database; the sidebar shows the returned row without reading history again
+                    st.session_state.setdefault('saved_since_fetch', []).append(email_service.save_email(
                         st.session_state.thread_id, 
                         brief, 
                         draft_result["subject"], 
                         draft_result["draft"]
-                    )
+                    ))
                     
                     st.success("✅ Draft created successfully!")
                     st.rerun()
@@ -167,25 +266,12 @@ def show_create_form(email_service):
     
     with col_reset:
         if st.button("🔄 Clear Form", use_container_width=True):
-            st.session_state.current_step = "create"
-            st.session_state.current_draft = None
-            st.session_state.current_subject = None
-            st.session_state.current_brief = None
-            st.session_state.thread_id = str(uuid.uuid4())
+            st.session_state.update(_DEFAULTS)
             st.rerun()
 
-def show_review_form(email_service):
-    """Show draft review form"""
-    st.header("✏️ Review & Edit Your Email")
-    
-    if not st.session_state.current_draft:
-        st.error("No draft found. Please create a new email.")
-        if st.button("← Back to Create"):
-            st.session_state.current_step = "create"
-            st.rerun()
-        return
-    
-    # Email preview and editing
+@st.fragment
+def editor_fragment():
+    """Subject/body editors and preview; keystrokes rerun only this fragment"""
     st.subheader("📄 Email Content")
     
     # Editable subject
@@ -205,12 +291,31 @@ def show_review_form(email_service):
     )
     st.session_state.current_draft = new_draft
     
-    # Preview
-    with st.expander("👀 Preview Email"):
+    # Preview, built only while toggled on (an expander would render its body even when collapsed)
+    if st.checkbox("👀 Preview Email", key="preview_open"):
         st.markdown("**Subject:** " + (new_subject or "*No subject*"))
         st.markdown("**To:** " + ", ".join(st.session_state.current_brief.recipients))
         st.markdown("**Body:**")
         st.markdown(new_draft)
+
+def show_review_form(email_service):
+    """Show draft review form"""
+    st.header("✏️ Review & Edit Your Email")
+    
+    if not st.session_state.current_draft:
+        st.error("No draft found. Please create a new email.")
+        if st.button("← Back to Create"):
+            st.session_state.current_step = "create"
+            st.rerun()
+        return
+    
+    if st.session_state.pop('draft_reused', False):
+        st.info("♻️ Reused similar prior draft")
+    
+    # Email preview and editing
+    editor_fragment()
+    new_subject = st.session_state.current_subject
+    new_draft = st.session_state.current_draft
     
     st.markdown("---")
     
@@ -226,33 +331,21 @@ def show_review_form(email_service):
                 st.error("Email body cannot be empty")
                 return
             
-            with st.spinner("📤 Sending email..."):
-                try:
-                    brief = st.session_state.current_brief
-                    result = email_service.send_email(
-                        new_subject,
-                        new_draft,
-                        brief.recipients
-                    )
-                    
-                    if result["success"]:
-                        email_service.update_email_status(
-                            st.session_state.thread_id, 
-                            "sent",
-                            {
-                                "subject": new_subject,
-                                "body": new_draft,
-                                "recipients": brief.recipients
-                            }
-                        )
-                        st.session_state.current_step = "sent"
-                        st.success("✅ " + result["message"])
-                        st.rerun()
-                    else:
-                        st.error("❌ " + result["message"])
-                
-                except Exception as e:
-                    st.error(f"Error sending email: {str(e)}")
+            try:
+                brief = st.session_state.current_brief
+                st.session_state.send_job_id = email_service.queue_email(
+                    st.session_state.thread_id,
+                    new_subject,
+                    new_draft,
+                    brief.recipients
+                )
+                st.session_state.pop("send_result", None)
+                clear_history_cache()
+                st.session_state.current_step = "sent"
+                st.rerun()
+            
+            except Exception as e:
+                st.error(f"Error sending email: {str(e)}")
     
     with col2:
         if st.button("✨ Improve Draft", use_container_width=True):
@@ -270,17 +363,14 @@ def show_review_form(email_service):
                     new_draft,
                     "saved"
                 )
+                clear_history_cache()
                 st.success("💾 Draft saved!")
             except Exception as e:
                 st.error(f"Error saving: {str(e)}")
     
     with col4:
         if st.button("← Start Over", use_container_width=True):
-            st.session_state.current_step = "create"
-            st.session_state.current_draft = None
-            st.session_state.current_subject = None
-            st.session_state.current_brief = None
-            st.session_state.thread_id = str(uuid.uuid4())
+            st.session_state.update(_DEFAULTS)
             st.rerun()
     
     # Improvement section
@@ -288,48 +378,77 @@ def show_review_form(email_service):
         st.markdown("---")
         st.subheader("✨ Improve Your Draft")
         
-        feedback = st.text_area(
-            "What would you like to change?",
-            placeholder="Examples:\n• Make it more formal\n• Add a specific deadline\n• Make it shorter\n• Change the tone to be more friendly",
-            height=80
-        )
+        # A form holds the feedback until submit, so typing doesn't rerun the script
+        with st.form("improve_form"):
+            feedback = st.text_area(
+                "What would you like to change?",
+                placeholder="Examples:\n• Make it more formal\n• Add a specific deadline\n• Make it shorter\n• Change the tone to be more friendly",
+                height=80
+            )
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                apply = st.form_submit_button("🔄 Apply Improvements", use_container_width=True)
+            with col2:
+                cancel = st.form_submit_button("❌ Cancel", use_container_width=True)
         
-        col1, col2 = st.columns(2)
-        with col1:
-            if st.button("🔄 Apply Improvements", use_container_width=True):
-                if not feedback.strip():
-                    st.warning("Please describe what you'd like to improve")
-                    return
-                
-                with st.spinner("🤖 Improving your draft..."):
-                    try:
-                        brief = st.session_state.current_brief
-                        improved = email_service.improve_draft(
-                            st.session_state.current_draft,
-                            feedback,
-                            brief
-                        )
-                        st.session_state.current_draft = improved
-                        st.session_state.show_improvement = False
-                        st.success("✅ Draft improved!")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error improving draft: {str(e)}")
+        if cancel:
+            st.session_state.show_improvement = False
+            st.rerun()
         
-        with col2:
-            if st.button("❌ Cancel", use_container_width=True):
-                st.session_state.show_improvement = False
-                st.rerun()
+        if apply:
+            if not feedback.strip():
+                st.warning("Please describe what you'd like to improve")
+                return
+            
+            with st.spinner("🤖 Improving your draft..."):
+                try:
+                    brief = st.session_state.current_brief
+                    improved = email_service.improve_draft(
+                        st.session_state.current_draft,
+                        feedback,
+                        brief
+                    )
+                    st.session_state.current_draft = improved
+                    st.session_state.show_improvement = False
+                    st.success("✅ Draft improved!")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error improving draft: {str(e)}")
 
-def show_sent_status():
+def show_sent_status(email_service):
     """Show sent email confirmation"""
-    st.header("✅ Email Sent Successfully!")
-    st.success("🎉 Your email has been delivered!")
+    job_id = st.session_state.get("send_job_id") or st.session_state.thread_id
+    # The backend forgets a job once its result has been read, so keep the final outcome here
+    job = st.session_state.get("send_result")
+    if not job or job["job_id"] != job_id:
+        job = email_service.get_job_status(job_id)
+        if job["status"] in ("sent", "failed"):
+            st.session_state.send_result = job
+            # The worker changed the row's status after the history was cached
+            clear_history_cache()
+    
+    if job["status"] == "failed":
+        st.header("❌ Email Not Sent")
+        st.error("❌ " + job["message"])
+        if st.button("← Back to Review", type="primary"):
+            st.session_state.current_step = "review"
+            st.rerun()
+        return
     
-    # Show sent email details
-    if st.session_state.current_brief:
-        brief = st.session_state.current_brief
-        st.info(f"📧 Sent to {len(brief.recipients)} recipient(s): {', '.join(brief.recipients)}")
+    if job["status"] != "sent":
+        st.header("📤 Sending Email...")
+        st.info(f"📧 Your email is {job['status']}. You can keep working while it is delivered.")
+        if st.button("🔄 Check Status"):
+            st.rerun()
+    else:
+        st.header("✅ Email Sent Successfully!")
+        st.success("🎉 Your email has been delivered!")
+        
+        # Show sent email details
+        if st.session_state.current_brief:
+            brief = st.session_state.current_brief
+            st.info(f"📧 Sent to {len(brief.recipients)} recipient(s): {', '.join(brief.recipients)}")
     
     with st.expander("📄 View Sent Email"):
         st.text_input("Subject:", value=st.session_state.current_subject or "", disabled=True)
@@ -339,11 +458,7 @@ def show_sent_status():
     
     with col1:
         if st.button("📝 Create Another Email", use_container_width=True, type="primary"):
-            st.session_state.current_step = "create"
-            st.session_state.current_draft = None
-            st.session_state.current_subject = None
-            st.session_state.current_brief = None
-            st.session_state.thread_id = str(uuid.uuid4())
+            st.session_state.update(_DEFAULTS)
             st.rerun()
     
     with col2:
@@ -351,14 +466,25 @@ def show_sent_status():
             st.session_state.current_step = "create"
             st.rerun()
 
+# The SMTP service is a long-lived client; successful connection probes are reused for a minute
+@st.cache_resource
+def get_smtp_service():
+    from email_service import email_service as es
+    return es
+
+@st.cache_data(ttl=60, show_spinner=False)
+def probe_smtp_connection(_es):
+    return _es.test_connection()
+
 def test_email_connection():
     """Test email connection"""
     try:
-        from email_service import email_service as es
-        result = es.test_connection()
+        result = probe_smtp_connection(get_smtp_service())
         if result['success']:
             st.success("✅ " + result['message'])
         else:
+            # Don't keep a failure around; the next click should retry once the setup is fixed
+            probe_smtp_connection.clear()
             st.error("❌ " + result['message'])
             st.info("""
             **Email Setup Required:**
@@ -1,21 +1,17 @@
-import subprocess
 import os
 import sys
+from pathlib import Path
 
 def main():
     """Run the Streamlit application from the project root directory"""
     
-    # Get the directory where this script is located (project root)
-    project_root = os.path.dirname(os.path.abspath(__file__))
-    
-    # Path to the frontend directory
-    frontend_dir = os.path.join(project_root, 'frontend')
-    
-    # Path to the app.py file
-    app_path = os.path.join(frontend_dir, 'app.py')
+    # Project root (where this script lives) and the files startup needs
+    project_root = Path(__file__).resolve().parent
+    app_path = project_root / 'frontend' / 'app.py'
+    env_path = project_root / '.env'
     
     # Check if the app.py file exists
-    if not os.path.exists(app_path):
+    if not app_path.is_file():
         print(f"❌ Error: app.py not found at {app_path}")
         print("Make sure you have the correct project structure:")
         print("├── backend/")
@@ -26,8 +22,7 @@ def main():
         sys.exit(1)
     
     # Check if .env file exists
-    env_path = os.path.join(project_root, '.env')
-    if not os.path.exists(env_path):
+    if not env_path.is_file():
         print("⚠️  Warning: .env file not found!")
         print("Create a .env file with your Google API key:")
         print("GOOGLE_API_KEY=your_api_key_here")
@@ -41,17 +36,24 @@ def main():
     print("Press Ctrl+C to stop the application")
     print("-" * 50)
     
+    # Server options, as they would be passed on the streamlit command line
+    flag_options = {
+        'server.address': 'localhost',
+        'server.port': 8501,
+        'browser.gatherUsageStats': False
+    }
+    
     try:
-        # Run streamlit with the app.py file
-        subprocess.run([
-            'streamlit', 'run', app_path,
-            '--server.address', 'localhost',
-            '--server.port', '8501',
-            '--browser.gatherUsageStats', 'false'
-        ], cwd=project_root)
+        # Start streamlit in this process instead of launching a second interpreter
+        from streamlit.web import bootstrap
+        
+        # The app and backend resolve the database relative to the project root
+        os.chdir(project_root)
+        bootstrap.load_config_options(flag_options=flag_options)
+        bootstrap.run(str(app_path), False, [], flag_options)
     except KeyboardInterrupt:
         print("\n👋 Application stopped by user")
-    except FileNotFoundError:
+    except ImportError:
         print("❌ Error: Streamlit not found!")
         print("Install it with: pip install streamlit")
         sys.exit(1)